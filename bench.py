@@ -0,0 +1,450 @@
+import argparse
+import copy
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+
+from ludo_engine import NUM_PLAYERS, SEARCH_MODES, AIPlayer, LudoGame
+
+def mid_game_positions(count, seed=0):
+    # Games in the "moving" state with a real choice to make, taken from
+    # seeded random play after the opening
+    rng_state = random.getstate()
+    random.seed(seed)
+    positions = []
+    while len(positions) < count:
+        game = LudoGame()
+        turns = 0
+        while not game.game_over and turns < 300:
+            turns += 1
+            if game.turn_state == "rolling":
+                game.roll_dice()
+            elif game.turn_state == "moving":
+                if turns > 60 and len(game.available_moves) >= 2 and random.random() < 0.1:
+                    positions.append(copy.deepcopy(game))
+                game.make_move(game.current_player, *random.choice(game.available_moves))
+            elif game.turn_state == "powerup":
+                game.use_powerup(game.current_player)
+    random.setstate(rng_state)
+    return positions[:count]
+
+def bench_search(positions, modes, depths, tt_size=0):
+    results = []
+    for depth in depths:
+        for mode in modes:
+            nodes = 0
+            probes = hits = 0
+            start = time.perf_counter()
+            for game in positions:
+                ai = AIPlayer(game.current_player, depth=depth, search=mode, tt_size=tt_size)
+                ai.get_move(game)
+                nodes += ai.nodes
+                if ai.tt is not None:
+                    probes += ai.tt.probes
+                    hits += ai.tt.hits
+            elapsed = time.perf_counter() - start
+            results.append({
+                "mode": mode,
+                "depth": depth,
+                "nodes": nodes,
+                "ms_per_move": 1000 * elapsed / len(positions),
+                "nodes_per_sec": nodes / elapsed,
+                "tt_hit_rate": hits / probes if probes else 0.0,
+            })
+    return results
+
+def bench_parallel(positions, mode, depth, worker_counts):
+    # Imported here so the other benchmarks never start worker processes
+    from ludo_parallel import SearchPool
+
+    start = time.perf_counter()
+    serial_moves = [AIPlayer(game.current_player, depth=depth, search=mode).get_move(game) for game in positions]
+    serial_time = time.perf_counter() - start
+    results = [{"workers": 0, "ms_per_move": 1000 * serial_time / len(positions), "speedup": 1.0, "identical": True}]
+    for workers in worker_counts:
+        with SearchPool(workers) as pool:
+            # Warm the pool up so process start-up is not part of the timing
+            AIPlayer(positions[0].current_player, depth=1, search=mode, pool=pool).get_move(positions[0])
+            start = time.perf_counter()
+            moves = [AIPlayer(game.current_player, depth=depth, search=mode, pool=pool).get_move(game)
+                     for game in positions]
+            elapsed = time.perf_counter() - start
+        results.append({
+            "workers": workers,
+            "ms_per_move": 1000 * elapsed / len(positions),
+            "speedup": serial_time / elapsed,
+            "identical": moves == serial_moves,
+        })
+    return results
+
+def win_rates(winners, games):
+    # Share of games each seat won, with the half-width of a 95% confidence
+    # interval
+    rates = []
+    for player_id in range(NUM_PLAYERS):
+        rate = winners.count(player_id) / games
+        rates.append((rate, 1.96 * math.sqrt(rate * (1 - rate) / games)))
+    return rates
+
+def bench_batch(games, policy_names, seed=0, batch_size=10000, max_turns=10000):
+    # Imported here so the other benchmarks do not need NumPy
+    from ludo_batch import POLICIES, BatchGame
+
+    policies = [POLICIES[name]() for name in policy_names]
+    winners = []
+    turns = 0
+    start = time.perf_counter()
+    for offset in range(0, games, batch_size):
+        batch = BatchGame(min(batch_size, games - offset), seed=(seed, offset))
+        winners.extend(batch.play(policies, max_turns).tolist())
+        turns += int(batch.turns.sum())
+    elapsed = time.perf_counter() - start
+    return {"games_per_sec": games / elapsed, "turns_per_game": turns / games,
+            "win_rates": win_rates(winners, games)}
+
+def bench_reference(games, policy_names, seed=0, max_turns=10000):
+    # The same policies playing LudoGame one game at a time
+    from ludo_batch import POLICIES
+    from selfplay import play_game
+
+    policies = [POLICIES[name]() for name in policy_names]
+    rng_state = random.getstate()
+    random.seed(seed)
+    winners = []
+    turns = 0
+    start = time.perf_counter()
+    for _ in range(games):
+        game, game_turns = play_game(policies, max_turns)
+        winners.append(game.winner if game.game_over else -1)
+        turns += game_turns
+    elapsed = time.perf_counter() - start
+    random.setstate(rng_state)
+    return {"games_per_sec": games / elapsed, "turns_per_game": turns / games,
+            "win_rates": win_rates(winners, games)}
+
+class SearchStatsCollector:
+    # Stands in for a StatsLog and keeps the search records in memory
+    def __init__(self):
+        self.records = []
+
+    def record(self, kind, fields):
+        self.records.append(fields)
+
+def bench_mcts(games, iterations, budget_ms=None, opponent_depth=2, workers=0, seed=0):
+    # MCTSPlayer in one seat, rotating through the seats, against AIPlayer
+    # in the other four. A player no better than its opponents wins 1 in
+    # NUM_PLAYERS games.
+    from ludo_mcts import MCTSPlayer
+    from selfplay import play_game
+
+    pool = None
+    if workers:
+        from ludo_parallel import SearchPool
+        pool = SearchPool(workers)
+    rng_state = random.getstate()
+    random.seed(seed)
+    collector = SearchStatsCollector()
+    wins = 0
+    start = time.perf_counter()
+    for game_index in range(games):
+        seat = game_index % NUM_PLAYERS
+        players = [AIPlayer(player_id, depth=opponent_depth) for player_id in range(NUM_PLAYERS)]
+        players[seat] = MCTSPlayer(seat, iterations, budget_ms, pool=pool, stats_log=collector,
+                                   seed=random.getrandbits(63))
+        game, _ = play_game(players)
+        wins += game.game_over and game.winner == seat
+    elapsed = time.perf_counter() - start
+    random.setstate(rng_state)
+    if pool is not None:
+        pool.close()
+    records = collector.records
+    move_ms = [record["elapsed_ms"] for record in records]
+    rollouts = sum(record["evaluations"] for record in records)
+    rate = wins / games
+    return {"games": games, "seconds": elapsed, "win_rate": rate,
+            "win_margin": 1.96 * math.sqrt(rate * (1 - rate) / games),
+            "rollouts_per_sec": 1000 * rollouts / sum(move_ms), "rollouts_per_move": rollouts / len(records),
+            "ms_per_move": sum(move_ms) / len(move_ms), "p99_ms": percentile(move_ms, 0.99),
+            "reused_moves": sum(1 for record in records if record["reused_visits"]) / len(records)}
+
+# The suite: seeded, repeatable benchmarks for the engine, the AI search and
+# the renderer, saved as JSON. Each metric is {"value", "unit", "better"},
+# where better is "higher" or "lower"; compare_results uses it to decide
+# which direction is a regression. Throughputs are the best of a few runs to
+# keep the noise down.
+SUITE_REPEATS = 3
+REGRESSION_THRESHOLD = 0.10
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def metric(value, unit, better="higher"):
+    return {"value": value, "unit": unit, "better": better}
+
+def best_rate(count, run):
+    # Highest count per second over SUITE_REPEATS calls of run()
+    best = math.inf
+    for _ in range(SUITE_REPEATS):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return count / best
+
+def bench_engine(positions, seed=0, games=50):
+    def generate_moves():
+        for game in positions:
+            for _ in range(100):
+                game.get_available_moves(game.current_player)
+
+    def round_trip():
+        for game in positions:
+            for _ in range(100):
+                game.apply_game_state(game.get_game_state())
+
+    actions = 0
+    def play_random():
+        # Seeded random games: every roll_dice, make_move and use_powerup
+        # call is one action
+        nonlocal actions
+        random.seed(seed)
+        actions = 0
+        for _ in range(games):
+            game = LudoGame()
+            while not game.game_over:
+                if game.turn_state == "rolling":
+                    game.roll_dice()
+                elif game.turn_state == "moving":
+                    game.make_move(game.current_player, *random.choice(game.available_moves))
+                else:
+                    game.use_powerup(game.current_player)
+                actions += 1
+
+    rng_state = random.getstate()
+    play_random()
+    results = {
+        "engine.move_generation": metric(best_rate(100 * len(positions), generate_moves), "calls/s"),
+        "engine.state_round_trip": metric(best_rate(100 * len(positions), round_trip), "round trips/s"),
+        "engine.actions": metric(best_rate(actions, play_random), "actions/s"),
+    }
+    random.setstate(rng_state)
+    return results
+
+def bench_minimax(positions, depths):
+    results = {}
+    for depth in depths:
+        nodes = 0
+        latencies = []
+        for game in positions:
+            ai = AIPlayer(game.current_player, depth=depth)
+            latency = math.inf
+            for _ in range(SUITE_REPEATS):
+                start = time.perf_counter()
+                ai.get_move(game)
+                latency = min(latency, 1000 * (time.perf_counter() - start))
+            latencies.append(latency)
+            nodes += ai.nodes
+        results[f"minimax.d{depth}.nodes_per_sec"] = metric(1000 * nodes / sum(latencies), "nodes/s")
+        for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            results[f"minimax.d{depth}.latency_{name}"] = metric(percentile(latencies, fraction), "ms", "lower")
+    return results
+
+def bench_selfplay(games, depth=1, seed=0):
+    from selfplay import play_game
+
+    rng_state = random.getstate()
+    def run():
+        random.seed(seed)
+        ai_players = [AIPlayer(i, depth=depth) for i in range(NUM_PLAYERS)]
+        for _ in range(games):
+            play_game(ai_players)
+    rate = best_rate(games, run)
+    random.setstate(rng_state)
+    return {f"selfplay.d{depth}.games_per_sec": metric(rate, "games/s")}
+
+def bench_render(positions, frames=300):
+    # Runs without a display through SDL's dummy video driver. Frames cycle
+    # through the token positions of the corpus so tokens and text change,
+    # all on the first position's board as in a real game.
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    try:
+        import ludo
+    except ImportError:
+        return {}
+    ludo.init_display()
+    pygame = ludo.pygame
+    games = []
+    for game in positions:
+        game = copy.copy(game)
+        game.board = positions[0].board
+        games.append(game)
+    # The first frame builds the static layer; not timed
+    ludo.draw_board(games[0])
+    frame_times = []
+    previous_dirty = None
+    for frame in range(frames):
+        start = time.perf_counter()
+        dirty = ludo.draw_board(games[frame % len(games)])
+        if dirty is None or previous_dirty is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(previous_dirty + dirty)
+        previous_dirty = dirty
+        frame_times.append(1000 * (time.perf_counter() - start))
+    pygame.quit()
+    return {
+        "render.frame_mean": metric(sum(frame_times) / frames, "ms", "lower"),
+        "render.frame_p99": metric(percentile(frame_times, 0.99), "ms", "lower"),
+    }
+
+def run_suite(seed=0, positions=100, depths=(1, 2, 3, 4), selfplay_games=100, skip_render=False):
+    corpus = mid_game_positions(positions, seed)
+    metrics = {}
+    metrics.update(bench_engine(corpus, seed))
+    metrics.update(bench_minimax(corpus, depths))
+    metrics.update(bench_selfplay(selfplay_games, seed=seed))
+    if not skip_render:
+        metrics.update(bench_render(corpus))
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"seed": seed, "positions": positions, "depths": list(depths), "selfplay_games": selfplay_games},
+        "metrics": metrics,
+    }
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # Rows of (name, baseline value, current value, relative change, status);
+    # the change is signed so that positive always means faster
+    rows = []
+    for name, old in baseline["metrics"].items():
+        new = current["metrics"].get(name)
+        if new is None:
+            rows.append((name, old["value"], None, None, "missing"))
+            continue
+        if old["better"] == "higher":
+            change = new["value"] / old["value"] - 1
+        else:
+            change = old["value"] / new["value"] - 1
+        if change < -threshold:
+            status = "REGRESSION"
+        elif change > threshold:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((name, old["value"], new["value"], change, status))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks for the Ludo rules engine and AI")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    search_parser = subparsers.add_parser("search", help="compare AI search modes at equal depth")
+    search_parser.add_argument("--modes", nargs="+", choices=SEARCH_MODES, default=["expectimax", "star1", "star2"])
+    search_parser.add_argument("--depths", nargs="+", type=int, default=[1, 2, 3, 4])
+    search_parser.add_argument("--positions", type=int, default=25)
+    search_parser.add_argument("--seed", type=int, default=0)
+    search_parser.add_argument("--tt-size", type=int, default=0, help="transposition table buckets (0: off)")
+    parallel_parser = subparsers.add_parser("parallel", help="root-parallel search scaling")
+    parallel_parser.add_argument("--mode", choices=SEARCH_MODES, default="star1")
+    parallel_parser.add_argument("--depth", type=int, default=4)
+    parallel_parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4, 8, 16])
+    parallel_parser.add_argument("--positions", type=int, default=25)
+    parallel_parser.add_argument("--seed", type=int, default=0)
+    batch_parser = subparsers.add_parser("batch", help="NumPy batch simulator throughput and win rates")
+    batch_parser.add_argument("--games", type=int, default=100000)
+    batch_parser.add_argument("--policies", nargs="+", choices=["random", "greedy", "evaluate"], default=["random"],
+                              help="one policy for every seat, or one per seat")
+    batch_parser.add_argument("--batch-size", type=int, default=10000, help="games played in lockstep")
+    batch_parser.add_argument("--reference-games", type=int, default=0,
+                              help="also play this many LudoGame games with the same policies to compare win rates")
+    batch_parser.add_argument("--seed", type=int, default=0)
+    batch_parser.add_argument("--max-turns", type=int, default=10000)
+    mcts_parser = subparsers.add_parser("mcts", help="MCTSPlayer rollouts/sec, move latency and strength against AIPlayer")
+    mcts_parser.add_argument("--games", type=int, default=100)
+    mcts_parser.add_argument("--iterations", type=int, default=200, help="rollouts per move")
+    mcts_parser.add_argument("--budget-ms", type=float, default=None, help="time per move instead of --iterations")
+    mcts_parser.add_argument("--opponent-depth", type=int, default=2)
+    mcts_parser.add_argument("--workers", type=int, default=0, help="processes for root-parallel search (0: serial)")
+    mcts_parser.add_argument("--seed", type=int, default=0)
+    suite_parser = subparsers.add_parser("suite", help="run the benchmark suite and save the results as JSON")
+    suite_parser.add_argument("--output", default="bench_results.json")
+    suite_parser.add_argument("--seed", type=int, default=0)
+    suite_parser.add_argument("--positions", type=int, default=100)
+    suite_parser.add_argument("--depths", nargs="+", type=int, default=[1, 2, 3, 4])
+    suite_parser.add_argument("--selfplay-games", type=int, default=100)
+    suite_parser.add_argument("--skip-render", action="store_true", help="leave out the draw_board benchmark")
+    compare_parser = subparsers.add_parser("compare", help="flag regressions against a saved baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                                help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    if args.command == "search":
+        positions = mid_game_positions(args.positions, args.seed)
+        results = bench_search(positions, args.modes, args.depths, args.tt_size)
+        baseline = {}
+        print(f"{'mode':<12}{'depth':>6}{'nodes':>12}{'vs first':>10}{'ms/move':>10}{'nodes/s':>12}{'tt hits':>9}")
+        for row in results:
+            base = baseline.setdefault(row["depth"], row["nodes"])
+            print(f"{row['mode']:<12}{row['depth']:>6}{row['nodes']:>12}{row['nodes'] / base:>10.2f}"
+                  f"{row['ms_per_move']:>10.2f}{row['nodes_per_sec']:>12.0f}{100 * row['tt_hit_rate']:>8.1f}%")
+    elif args.command == "parallel":
+        positions = mid_game_positions(args.positions, args.seed)
+        results = bench_parallel(positions, args.mode, args.depth, args.workers)
+        print(f"{'workers':>8}{'ms/move':>10}{'speedup':>9}  identical to serial")
+        for row in results:
+            workers = row["workers"] or "serial"
+            print(f"{workers:>8}{row['ms_per_move']:>10.2f}{row['speedup']:>9.2f}  {row['identical']}")
+    elif args.command == "batch":
+        policies = args.policies * NUM_PLAYERS if len(args.policies) == 1 else args.policies
+        if len(policies) != NUM_PLAYERS:
+            parser.error(f"--policies takes 1 or {NUM_PLAYERS} names")
+        runs = [("batch", args.games, bench_batch(args.games, policies, args.seed, args.batch_size, args.max_turns))]
+        if args.reference_games:
+            runs.append(("LudoGame", args.reference_games,
+                         bench_reference(args.reference_games, policies, args.seed, args.max_turns)))
+        print(f"{'engine':<10}{'games':>9}{'games/s':>10}{'turns/game':>12}"
+              + "".join(f"{f'P{i+1} wins (95% CI)':>20}" for i in range(NUM_PLAYERS)))
+        for name, games, row in runs:
+            print(f"{name:<10}{games:>9}{row['games_per_sec']:>10.0f}{row['turns_per_game']:>12.1f}"
+                  + "".join(f"{100 * rate:>13.2f} +-{100 * margin:4.2f}" for rate, margin in row["win_rates"]))
+    elif args.command == "mcts":
+        row = bench_mcts(args.games, args.iterations, args.budget_ms, args.opponent_depth, args.workers, args.seed)
+        print(f"{row['games']} games in {row['seconds']:.1f} s against AIPlayer(depth={args.opponent_depth})")
+        print(f"win rate {100 * row['win_rate']:.1f}% +-{100 * row['win_margin']:.1f} "
+              f"(an equal player wins {100 / NUM_PLAYERS:.0f}%)")
+        print(f"{row['rollouts_per_sec']:.0f} rollouts/s, {row['rollouts_per_move']:.0f} rollouts/move")
+        print(f"{row['ms_per_move']:.1f} ms/move, p99 {row['p99_ms']:.1f} ms, "
+              f"tree reused on {100 * row['reused_moves']:.1f}% of moves")
+    elif args.command == "suite":
+        results = run_suite(args.seed, args.positions, args.depths, args.selfplay_games, args.skip_render)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        for name, row in results["metrics"].items():
+            print(f"{name:<32}{row['value']:>14.2f} {row['unit']}")
+        print(f"saved to {args.output}")
+    elif args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        rows = compare_results(baseline, current, args.threshold)
+        print(f"{'metric':<32}{'baseline':>14}{'current':>14}{'change':>9}")
+        for name, old, new, change, status in rows:
+            if new is None:
+                print(f"{name:<32}{old:>14.2f}{'-':>14}{'-':>9}  {status}")
+            else:
+                print(f"{name:<32}{old:>14.2f}{new:>14.2f}{100 * change:>8.1f}%  {status}")
+        regressions = sum(1 for row in rows if row[4] == "REGRESSION")
+        print(f"{regressions} regression(s) beyond {100 * args.threshold:.0f}%")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+
+from bench import percentile
+
+DEFAULT_SEATS = "human,minimax:1,minimax:1,minimax:1,minimax:1"
+SERVER_START_TIMEOUT = 30
+
+async def connect(args):
+    if args.unix:
+        return await asyncio.open_unix_connection(args.unix)
+    return await asyncio.open_connection(args.host, args.port)
+
+async def request(reader, writer, message):
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+class Stats:
+    def __init__(self, start):
+        # Only moves made after start are counted, so the tables have all
+        # got going by then
+        self.start = start
+        self.ai_latency = []
+        self.human_latency = []
+        self.games = 0
+        self.refused = 0
+
+    def add(self, latencies, value, now):
+        if now >= self.start:
+            latencies.append(value)
+
+async def play_tables(args, stats, end, rng):
+    # One client: plays the human seats of a table over its own connection,
+    # starting a new table after every game until end. An AI move's latency
+    # is the time from the update where the table started waiting for it to
+    # the update with the move; a human move's, the time from sending it to
+    # its update.
+    seats = args.seats.split(",")
+    reader, writer = await connect(args)
+    try:
+        while time.perf_counter() < end:
+            writer.write(json.dumps({"op": "create", "seats": seats}).encode() + b"\n")
+            await writer.drain()
+            message = json.loads(await reader.readline())
+            if message["type"] == "error":
+                stats.refused += 1
+                await asyncio.sleep(0.1)
+                continue
+            table = message["table"]
+            view = json.loads(await reader.readline())
+            last = time.perf_counter()
+            sent = None
+            while view["winner"] is None and time.perf_counter() < end:
+                if seats[view["current_player"]] == "human" and sent is None:
+                    if args.think_ms:
+                        await asyncio.sleep(args.think_ms / 1000 * rng.random() * 2)
+                    if view["turn_state"] == "rolling":
+                        action = {"op": "roll", "table": table}
+                    else:
+                        token, move_type = rng.choice(view["moves"])
+                        action = {"op": "move", "table": table, "token": token, "move_type": move_type}
+                    writer.write(json.dumps(action).encode() + b"\n")
+                    await writer.drain()
+                    sent = time.perf_counter()
+                message = json.loads(await reader.readline())
+                now = time.perf_counter()
+                if message["type"] == "error":
+                    raise RuntimeError(f"server error: {message['error']}")
+                if message["type"] == "snapshot":
+                    view = message
+                else:
+                    if seats[view["current_player"]] != "human" and view["turn_state"] == "moving":
+                        stats.add(stats.ai_latency, now - last, now)
+                    changes = message["changes"]
+                    for index, position in changes.pop("tokens", ()):
+                        view["tokens"][index] = position
+                    view.update(changes)
+                if sent is not None:
+                    stats.add(stats.human_latency, now - sent, now)
+                    sent = None
+                last = now
+            if view["winner"] is not None:
+                stats.games += 1
+            writer.write(json.dumps({"op": "leave", "table": table}).encode() + b"\n")
+            await writer.drain()
+    finally:
+        writer.close()
+
+async def run_step(args, tables, rng):
+    start = time.perf_counter()
+    stats = Stats(start + args.warmup)
+    end = start + args.warmup + args.duration
+    await asyncio.gather(*(play_tables(args, stats, end, random.Random(rng.getrandbits(63)))
+                           for _ in range(tables)))
+    return stats
+
+async def run(args):
+    reader, writer = await connect(args)
+    info = await request(reader, writer, {"op": "info"})
+    writer.close()
+    workers = info["workers"]
+    rng = random.Random(args.seed)
+    print(f"server has {workers} AI workers; seats {args.seats}; latency budget p99 {args.budget_ms:.0f} ms")
+    print(f"{'tables':>7}{'AI moves/s':>12}{'AI p50 ms':>11}{'AI p99 ms':>11}{'human p50':>11}{'human p99':>11}"
+          f"{'games':>7}{'refused':>9}")
+    best = 0
+    tables = args.start_tables
+    while tables <= args.max_tables:
+        stats = await run_step(args, tables, rng)
+        if not stats.ai_latency:
+            print(f"{tables:>7}  no AI moves measured")
+            break
+        p50 = 1000 * percentile(stats.ai_latency, 0.5)
+        p99 = 1000 * percentile(stats.ai_latency, 0.99)
+        human = stats.human_latency or [0.0]
+        print(f"{tables:>7}{len(stats.ai_latency) / args.duration:>12.1f}{p50:>11.1f}{p99:>11.1f}"
+              f"{1000 * percentile(human, 0.5):>11.1f}{1000 * percentile(human, 0.99):>11.1f}"
+              f"{stats.games:>7}{stats.refused:>9}", flush=True)
+        if p99 > args.budget_ms:
+            break
+        best = tables
+        tables *= 2
+    if best:
+        print(f"{best} tables within budget: {best / workers:.1f} tables per core")
+    else:
+        print("the latency budget is broken with a single table")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(args):
+    # Runs ludo_server.py in its own process and waits until it accepts
+    # connections
+    args.port = free_port()
+    command = [sys.executable, "ludo_server.py", "--host", args.host, "--port", str(args.port)]
+    if args.workers:
+        command += ["--workers", str(args.workers)]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while True:
+        try:
+            socket.create_connection((args.host, args.port)).close()
+            return server
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError("ludo_server.py did not start")
+            time.sleep(0.1)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for ludo_server.py")
+    parser.add_argument("--connect", help="HOST:PORT of a running server (default: start one)")
+    parser.add_argument("--unix", help="Unix socket path of a running server")
+    parser.add_argument("--workers", type=int, default=None, help="AI processes for the server this starts")
+    parser.add_argument("--seats", default=DEFAULT_SEATS, help="seats of every table, comma separated")
+    parser.add_argument("--think-ms", type=float, default=200, help="mean time a human takes per action")
+    parser.add_argument("--budget-ms", type=float, default=250, help="p99 AI move latency allowed")
+    parser.add_argument("--start-tables", type=int, default=1)
+    parser.add_argument("--max-tables", type=int, default=1024, help="tables double each step up to this")
+    parser.add_argument("--duration", type=float, default=10, help="seconds measured per step")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds per step before measuring")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    args.host = "127.0.0.1"
+    server = None
+    if args.connect:
+        args.host, _, port = args.connect.rpartition(":")
+        args.port = int(port)
+    elif not args.unix:
+        server = start_server(args)
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
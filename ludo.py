@@ -1,309 +1,102 @@
-import pygame
-import random
-import math
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-# Initialize pygame
-pygame.init()
+from ludo_engine import (
+    DOUBLE_ROLL, NUM_TILES, PLAYER_COLORS, SAFE_ZONE, AIPlayer, CompactState, LudoGame,
+)
+from ludo_geometry import HEIGHT, WIDTH, BoardGeometry
+from ludo_profile import RollingAverages, StatsLog
 
-# Constants
-WIDTH, HEIGHT = 950, 750
-BOARD_SIZE = 400
-CENTER = (WIDTH // 2, HEIGHT // 2)
-PLAYER_COLORS = [(255, 50, 50), (50, 255, 50), (50, 50, 255), (255, 255, 50), (255, 50, 255)]
-TOKEN_RADIUS = 16
+# Layout constants
 DICE_SIZE = 50
 SAFE_TILE_COLOR = (220, 220, 220)
 POWERUP_TILE_COLOR = (180, 230, 255)
-NUM_TILES = 40
-MIN_RADIUS = BOARD_SIZE // 2 - 100
-MAX_RADIUS = BOARD_SIZE // 2
-DOUBLE_ROLL = "double_roll"
-SAFE_ZONE = "safe_zone"
+FPS = 30
+PROFILE_POS = (10, 10)
 
-# Set up the display
-screen = pygame.display.set_mode((WIDTH, HEIGHT))
-pygame.display.set_caption("5-Player Ludo with AI")
-font = pygame.font.SysFont('Arial', 18, bold=True)
-large_font = pygame.font.SysFont('Arial', 28, bold=True)
-small_font = pygame.font.SysFont('Arial', 14)
+# pygame and the display are only set up once the window is actually opened,
+# so the rules engine can be used on machines without a display
+pygame = None
+screen = None
+font = None
+large_font = None
+small_font = None
+geometry = None
 
-class Token:
-    def __init__(self):
-        self.position = -1  # -1: home base, 0-39: on board, 40: reached home
-
-class Player:
-    def __init__(self, player_id, color):
-        self.id = player_id
-        self.color = color
-        self.tokens = [Token() for _ in range(3)]
-        self.tokens_home = 0
-    
-    def get_score(self):
-        score = self.tokens_home * 10
-        for token in self.tokens:
-            if token.position >= 0:
-                score += (40 - token.position)
-        return score
+def init_display():
+    global pygame, screen, font, large_font, small_font, geometry
+    import pygame
+    pygame.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
+    pygame.display.set_caption("5-Player Ludo with AI")
+    font = pygame.font.SysFont('Arial', 18, bold=True)
+    large_font = pygame.font.SysFont('Arial', 28, bold=True)
+    small_font = pygame.font.SysFont('Arial', 14)
+    geometry = BoardGeometry(WIDTH, HEIGHT)
 
-class LudoGame:
-    def __init__(self):
-        self.reset_game()
-        
-    def reset_game(self):
-        self.board = self.create_board()
-        self.players = [Player(i, PLAYER_COLORS[i]) for i in range(5)]
-        self.current_player = 0
-        self.dice_roll = 1
-        self.game_over = False
-        self.winner = None
-        self.turn_state = "rolling"
-        self.available_moves = []
-        self.powerup_effect = None
-        pygame.display.flip()
-    
-    def create_board(self):
-        board = []
-        for player_id in range(5):
-            path = []
-            for tile in range(40):
-                if tile in [0, 8, 16, 24, 32]:
-                    tile_type = SAFE_ZONE
-                elif tile in [5, 13, 21, 29, 37]:
-                    tile_type = random.choice([DOUBLE_ROLL, SAFE_ZONE])
-                else:
-                    tile_type = "normal"
-                path.append({"type": tile_type, "occupants": []})
-            board.append(path)
-        return board
-    
-    def roll_dice(self):
-        if self.turn_state != "rolling":
-            return False
-        self.dice_roll = random.randint(1, 6)
-        self.turn_state = "moving"
-        self.available_moves = self.get_available_moves(self.current_player)
-        if not self.available_moves:
-            self.next_player()
-            return True
-        return True
-    
-    def get_available_moves(self, player_id):
-        moves = []
-        player = self.players[player_id]
-        for token_id, token in enumerate(player.tokens):
-            if token.position == -1:
-                if self.dice_roll == 6:
-                    moves.append((token_id, "start"))
-            elif token.position >= 0:
-                new_pos = token.position + self.dice_roll
-                if new_pos >= 39:
-                    moves.append((token_id, "home"))
-                else:
-                    moves.append((token_id, "move"))
-        return moves
-    
-    def make_move(self, player_id, token_id, move_type):
-        if self.turn_state != "moving":
-            return False
-        player = self.players[player_id]
-        if token_id < 0 or token_id >= len(player.tokens):
-            return False
-        token = player.tokens[token_id]
-        if move_type == "start":
-            if token.position != -1 or self.dice_roll != 6:
-                return False
-            token.position = 0
-            self.board[player_id][0]["occupants"].append((player_id, token_id))
-        elif move_type == "move":
-            if not (0 <= token.position < 40):
-                return False
-            current_tile = self.board[player_id][token.position]
-            if (player_id, token_id) not in current_tile["occupants"]:
-                return False
-            new_pos = token.position + self.dice_roll
-            if new_pos >= 40:
-                return False
-            current_tile["occupants"].remove((player_id, token_id))
-            new_tile = self.board[player_id][new_pos]
-            if new_tile["type"] != SAFE_ZONE:
-                for opp_player_id, opp_token_id in new_tile["occupants"]:
-                    if opp_player_id != player_id:
-                        self.players[opp_player_id].tokens[opp_token_id].position = -1
-                new_tile["occupants"] = []
-            token.position = new_pos
-            new_tile["occupants"].append((player_id, token_id))
-            if new_tile["type"] in [DOUBLE_ROLL, SAFE_ZONE]:
-                self.powerup_effect = new_tile["type"]
-                self.turn_state = "powerup"
-                return True
-        elif move_type == "home":
-            if not (0 <= token.position < 40):
-                return False
-            current_tile = self.board[player_id][token.position]
-            if (player_id, token_id) not in current_tile["occupants"]:
-                return False
-            current_tile["occupants"].remove((player_id, token_id))
-            token.position = 40
-            player.tokens_home += 1
-            if player.tokens_home >= 2:
-                self.game_over = True
-                self.winner = player_id
-                return True
-        else:
-            return False
-        if self.turn_state != "powerup":
-            self.next_player()
-        return True
-    
-    def use_powerup(self, player_id):
-        if self.turn_state != "powerup":
-            return False
-        if self.powerup_effect == DOUBLE_ROLL:
-            self.turn_state = "rolling"
-            self.powerup_effect = None
-            return True
-        elif self.powerup_effect == SAFE_ZONE:
-            self.next_player()
-            self.powerup_effect = None
-            return True
-        return False
-    
-    def next_player(self):
-        self.current_player = (self.current_player + 1) % 5
-        self.turn_state = "rolling"
-        self.dice_roll = 1
-        self.available_moves = []
-    
-    def get_game_state(self):
-        state = {
-            "current_player": self.current_player,
-            "players": [],
-            "board": self.board,
-            "dice_roll": self.dice_roll,
-            "available_moves": self.available_moves
-        }
-        for player in self.players:
-            player_state = {
-                "id": player.id,
-                "tokens_home": player.tokens_home,
-                "tokens": [token.position for token in player.tokens]
-            }
-            state["players"].append(player_state)
-        return state
-    
-    def apply_game_state(self, state):
-        self.current_player = state["current_player"]
-        self.dice_roll = state["dice_roll"]
-        self.available_moves = state["available_moves"]
-        for player_state in state["players"]:
-            player = self.players[player_state["id"]]
-            player.tokens_home = player_state["tokens_home"]
-            for i, pos in enumerate(player_state["tokens"]):
-                player.tokens[i].position = pos
-        for path in self.board:
-            for tile in path:
-                tile["occupants"] = []
-        for player in self.players:
-            for token_id, token in enumerate(player.tokens):
-                if 0 <= token.position < 40:
-                    self.board[player.id][token.position]["occupants"].append((player.id, token_id))
+# Static board layer and text glyphs, rendered once and reused every frame.
+# The layer is rebuilt whenever reset_game creates a new board or the
+# geometry is reconfigured.
+_static_layer = None
+_static_board = None
+_static_size = None
+_glyphs = {}
+_dice_faces = {}
+_overlay = None
 
-class AIPlayer:
-    def __init__(self, player_id, depth=2):
-        self.player_id = player_id
-        self.depth = depth
-    
-    def get_move(self, game):
-        original_state = game.get_game_state()
-        best_move = None
-        best_value = -math.inf
-        for move in original_state["available_moves"]:
-            game_copy = LudoGame()
-            game_copy.apply_game_state(original_state)
-            game_copy.make_move(self.player_id, move[0], move[1])
-            value = self.minimax(game_copy, self.depth - 1, -math.inf, math.inf, False)
-            if value > best_value:
-                best_value = value
-                best_move = move
-        return best_move
-    
-    def minimax(self, game, depth, alpha, beta, is_maximizing):
-        if depth == 0 or game.game_over:
-            return self.evaluate(game)
-        current_player_id = game.current_player
-        is_current_player = (current_player_id == self.player_id)
-        if is_current_player or is_maximizing:
-            max_eval = -math.inf
-            for move in game.get_available_moves(current_player_id):
-                game_copy = LudoGame()
-                game_copy.apply_game_state(game.get_game_state())
-                game_copy.make_move(current_player_id, move[0], move[1])
-                eval = self.minimax(game_copy, depth - 1, alpha, beta, False)
-                max_eval = max(max_eval, eval)
-                alpha = max(alpha, eval)
-                if beta <= alpha:
-                    break
-            return max_eval
-        else:
-            min_eval = math.inf
-            for move in game.get_available_moves(current_player_id):
-                game_copy = LudoGame()
-                game_copy.apply_game_state(game.get_game_state())
-                game_copy.make_move(current_player_id, move[0], move[1])
-                eval = self.minimax(game_copy, depth - 1, alpha, beta, True)
-                min_eval = min(min_eval, eval)
-                beta = min(beta, eval)
-                if beta <= alpha:
-                    break
-            return min_eval
-    
-    def evaluate(self, game):
-        our_score = game.players[self.player_id].get_score()
-        opponents_score = sum(p.get_score() for i, p in enumerate(game.players) if i != self.player_id)
-        return our_score - (opponents_score / 4)
+DICE_PIPS = {
+    1: [(0, 0)],
+    2: [(-10, -10), (10, 10)],
+    3: [(-10, -10), (0, 0), (10, 10)],
+    4: [(-10, -10), (-10, 10), (10, -10), (10, 10)],
+    5: [(-10, -10), (-10, 10), (10, -10), (10, 10), (0, 0)],
+    6: [(-10, -10), (-10, 0), (-10, 10), (10, -10), (10, 0), (10, 10)],
+}
 
-def get_pentagon_point(center, radius, point_idx):
-    angle = 2 * math.pi * point_idx / 5 - math.pi/2
-    x = center[0] + radius * math.cos(angle)
-    y = center[1] + radius * math.sin(angle)
-    return (x, y)
+def resize_display(width, height, scale=None):
+    # Lays the board out for a new window size; the static layer and the
+    # overlay are rebuilt on the next draw_board
+    global screen, _overlay
+    screen = pygame.display.set_mode((width, height), pygame.RESIZABLE)
+    if scale is None:
+        scale = min(width / WIDTH, height / HEIGHT)
+    geometry.configure(width, height, scale)
+    _overlay = None
 
-def get_tile_position(player_id, tile_idx):
-    player_angle = 2 * math.pi * player_id / 5 - math.pi / 2
-    segment_length = 8
-    segment = tile_idx // segment_length
-    segment_pos = tile_idx % segment_length
-    start_angle = player_angle + (2 * math.pi / 5) * segment
-    end_angle = player_angle + (2 * math.pi / 5) * (segment + 1)
-    t = segment_pos / segment_length
-    angle = start_angle * (1 - t) + end_angle * t
-    radius = MIN_RADIUS + (MAX_RADIUS - MIN_RADIUS) * abs(t - 0.5) * 2
-    x = CENTER[0] + radius * math.cos(angle)
-    y = CENTER[1] + radius * math.sin(angle)
-    return int(x), int(y)
+def render_text(text_font, text, color):
+    key = (id(text_font), text, color)
+    surface = _glyphs.get(key)
+    if surface is None:
+        surface = _glyphs[key] = text_font.render(text, True, color)
+    return surface
 
-def get_home_base_position(player_id):
-    angle = 2 * math.pi * player_id / 5 - math.pi/2
-    x = CENTER[0] + (BOARD_SIZE//2 + 70) * math.cos(angle)
-    y = CENTER[1] + (BOARD_SIZE//2 + 70) * math.sin(angle)
-    return (int(x), int(y))
+def get_panel_rect(player_id):
+    panel_width = 130
+    panel_height = 90
+    home_pos = geometry.home_bases[player_id]
+    if player_id == 1:
+        panel_x = home_pos[0] + geometry.home_radius + 5
+    else:
+        panel_x = home_pos[0] - panel_width - geometry.home_radius - 5
+    return pygame.Rect(panel_x, home_pos[1] - panel_height // 2, panel_width, panel_height)
 
-def draw_board(game):
-    screen.fill((245, 245, 220))  # Cream background for a classic look
+def render_static_layer(game):
+    layer = pygame.Surface((geometry.width, geometry.height)).convert()
+    layer.fill((245, 245, 220))  # Cream background for a classic look
     
     # Draw central home area
-    pygame.draw.polygon(screen, (255, 255, 255), [get_pentagon_point(CENTER, 60, i) for i in range(5)])
-    pygame.draw.polygon(screen, (0, 0, 0), [get_pentagon_point(CENTER, 60, i) for i in range(5)], 3)
+    pygame.draw.polygon(layer, (255, 255, 255), geometry.home_area)
+    pygame.draw.polygon(layer, (0, 0, 0), geometry.home_area, 3)
     
     # Draw main board
-    board_points = [get_pentagon_point(CENTER, BOARD_SIZE//2, i) for i in range(5)]
-    pygame.draw.polygon(screen, (150, 150, 150), board_points)
-    pygame.draw.polygon(screen, (0, 0, 0), board_points, 3)
+    pygame.draw.polygon(layer, (150, 150, 150), geometry.board_outline)
+    pygame.draw.polygon(layer, (0, 0, 0), geometry.board_outline, 3)
     
     # Draw paths and tiles with distinct colors for each player's region
     for player_id in range(5):
         for tile_idx in range(NUM_TILES):
-            pos = get_tile_position(player_id, tile_idx)
+            pos = geometry.tiles[player_id][tile_idx]
             tile = game.board[player_id][tile_idx]
             
             # Determine the region based on tile index (each player gets 8 tiles per segment)
@@ -324,72 +117,101 @@ def draw_board(game):
                 border_color = (50, 50, 50)
                 symbol = ""
             
-            pygame.draw.rect(screen, color, (pos[0]-13, pos[1]-13, 26, 26), border_radius=4)
-            pygame.draw.rect(screen, border_color, (pos[0]-13, pos[1]-13, 26, 26), 2, border_radius=4)
+            half = geometry.tile_half_size
+            rect = (pos[0] - half, pos[1] - half, 2 * half, 2 * half)
+            pygame.draw.rect(layer, color, rect, border_radius=4)
+            pygame.draw.rect(layer, border_color, rect, 2, border_radius=4)
             if symbol:
-                mark_text = small_font.render(symbol, True, (50, 50, 50))
-                screen.blit(mark_text, (pos[0]-mark_text.get_width()//2, pos[1]-mark_text.get_height()//2))
+                mark_text = render_text(small_font, symbol, (50, 50, 50))
+                layer.blit(mark_text, (pos[0]-mark_text.get_width()//2, pos[1]-mark_text.get_height()//2))
     
     # Draw home bases
     for player_id in range(5):
-        home_pos = get_home_base_position(player_id)
-        pygame.draw.circle(screen, PLAYER_COLORS[player_id], home_pos, 45)
-        pygame.draw.circle(screen, (0, 0, 0), home_pos, 45, 3)
-        label = font.render(f"Player {player_id+1}", True, (255, 255, 255))
-        screen.blit(label, (home_pos[0]-label.get_width()//2, home_pos[1]-label.get_height()//2))
+        home_pos = geometry.home_bases[player_id]
+        pygame.draw.circle(layer, PLAYER_COLORS[player_id], home_pos, geometry.home_radius)
+        pygame.draw.circle(layer, (0, 0, 0), home_pos, geometry.home_radius, 3)
+        label = render_text(font, f"Player {player_id+1}", (255, 255, 255))
+        layer.blit(label, (home_pos[0]-label.get_width()//2, home_pos[1]-label.get_height()//2))
+    
+    # Draw player status panels to the left or right of home bases
+    for player_id in range(5):
+        panel = get_panel_rect(player_id)
+        pygame.draw.rect(layer, (240, 240, 240), panel, border_radius=8)
+        pygame.draw.rect(layer, PLAYER_COLORS[player_id], panel, 2, border_radius=8)
+        label = render_text(font, f"Player {player_id+1}", (0, 0, 0))
+        layer.blit(label, (panel.x + 10, panel.y + 10))
+    return layer
+
+def get_dice_face(value):
+    face = _dice_faces.get(value)
+    if face is None:
+        face = pygame.Surface((DICE_SIZE, DICE_SIZE), pygame.SRCALPHA)
+        pygame.draw.rect(face, (255, 255, 255), (0, 0, DICE_SIZE, DICE_SIZE), border_radius=5)
+        pygame.draw.rect(face, (0, 0, 0), (0, 0, DICE_SIZE, DICE_SIZE), 2, border_radius=5)
+        for dx, dy in DICE_PIPS.get(value, []):
+            pygame.draw.circle(face, (0, 0, 0), (DICE_SIZE//2 + dx, DICE_SIZE//2 + dy), 5)
+        _dice_faces[value] = face
+    return face
+
+def get_overlay():
+    global _overlay
+    if _overlay is None:
+        _overlay = pygame.Surface((geometry.width, geometry.height), pygame.SRCALPHA)
+        _overlay.fill((0, 0, 0, 180))
+    return _overlay
+
+def draw_board(game):
+    # Draws a frame onto the screen. Returns the rects that changed on top of
+    # the static layer, or None when the whole screen has to be updated.
+    global _static_layer, _static_board, _static_size
+    full_update = False
+    size = (geometry.width, geometry.height, geometry.scale)
+    if _static_board is not game.board or _static_size != size:
+        _static_layer = render_static_layer(game)
+        _static_board = game.board
+        _static_size = size
+        full_update = True
+    token_radius = geometry.token_radius
+    screen.blit(_static_layer, (0, 0))
+    dirty = []
+    
+    # Draw tokens waiting in the home bases
+    for player_id in range(5):
         player = game.players[player_id]
         for token_idx, token in enumerate(player.tokens):
             if token.position == -1:
-                angle = 2 * math.pi * token_idx / len(player.tokens)
-                token_x = home_pos[0] + 25 * math.cos(angle)
-                token_y = home_pos[1] + 25 * math.sin(angle)
-                pygame.draw.circle(screen, (255, 255, 255), (token_x, token_y), TOKEN_RADIUS)
-                pygame.draw.circle(screen, PLAYER_COLORS[player_id], (token_x, token_y), TOKEN_RADIUS-3)
+                slot = geometry.base_slots[player_id][token_idx]
+                dirty.append(pygame.draw.circle(screen, (255, 255, 255), slot, token_radius))
+                pygame.draw.circle(screen, PLAYER_COLORS[player_id], slot, token_radius-3)
     
     # Draw tokens on board
     for player in game.players:
         for token_id, token in enumerate(player.tokens):
             if 0 <= token.position < 40:
-                pos = get_tile_position(player.id, token.position)
-                pygame.draw.circle(screen, player.color, pos, TOKEN_RADIUS)
-                pygame.draw.circle(screen, (255, 255, 255), pos, TOKEN_RADIUS-3, 2)
-                num_text = small_font.render(str(token_id+1), True, (255, 255, 255))
+                pos = geometry.tiles[player.id][token.position]
+                dirty.append(pygame.draw.circle(screen, player.color, pos, token_radius))
+                pygame.draw.circle(screen, (255, 255, 255), pos, token_radius-3, 2)
+                num_text = render_text(small_font, str(token_id+1), (255, 255, 255))
                 screen.blit(num_text, (pos[0]-num_text.get_width()//2, pos[1]-num_text.get_height()//2))
             elif token.position == 40:
-                center_pos = get_pentagon_point(CENTER, 30, player.id)
-                pygame.draw.circle(screen, player.color, center_pos, TOKEN_RADIUS+2)
-                pygame.draw.circle(screen, (255, 255, 255), center_pos, TOKEN_RADIUS, 2)
+                center_pos = geometry.home_slots[player.id]
+                dirty.append(pygame.draw.circle(screen, player.color, center_pos, token_radius+2))
+                pygame.draw.circle(screen, (255, 255, 255), center_pos, token_radius, 2)
     
     # Highlight current player's tokens with a yellow outline
     if not game.game_over:
         player = game.players[game.current_player]
         for token_id, token in enumerate(player.tokens):
             if 0 <= token.position < 40:
-                pos = get_tile_position(player.id, token.position)
-                pygame.draw.circle(screen, (255, 255, 0), pos, TOKEN_RADIUS+3, 3)
+                pos = geometry.tiles[player.id][token.position]
+                dirty.append(pygame.draw.circle(screen, (255, 255, 0), pos, token_radius+3, 3))
             elif token.position == -1:
-                home_pos = get_home_base_position(player.id)
-                angle = 2 * math.pi * token_id / len(player.tokens)
-                token_x = home_pos[0] + 25 * math.cos(angle)
-                token_y = home_pos[1] + 25 * math.sin(angle)
-                pygame.draw.circle(screen, (255, 255, 0), (token_x, token_y), TOKEN_RADIUS+3, 3)
+                slot = geometry.base_slots[player.id][token_id]
+                dirty.append(pygame.draw.circle(screen, (255, 255, 0), slot, token_radius+3, 3))
     
-    # Draw player status panels to the left or right of home bases
-    panel_width = 130
-    panel_height = 90
-    padding = 20
+    # Draw player status text into the panels
     for player_id in range(5):
-        home_pos = get_home_base_position(player_id)
-        if player_id == 1:
-            panel_x = home_pos[0] + 50
-            panel_y = home_pos[1] - panel_height // 2
-        else:
-            panel_x = home_pos[0] - panel_width - 50
-            panel_y = home_pos[1] - panel_height // 2
-        pygame.draw.rect(screen, (240, 240, 240), (panel_x, panel_y, panel_width, panel_height), border_radius=8)
-        pygame.draw.rect(screen, PLAYER_COLORS[player_id], (panel_x, panel_y, panel_width, panel_height), 2, border_radius=8)
-        label = font.render(f"Player {player_id+1}", True, (0, 0, 0))
-        screen.blit(label, (panel_x + 10, panel_y + 10))
+        panel = get_panel_rect(player_id)
         player = game.players[player_id]
         status_text = f"Home: {player.tokens_home}/3"
         if any(token.position == -1 for token in player.tokens):
@@ -398,48 +220,15 @@ def draw_board(game):
             status_text += "\nOn board: " + ",".join(str(i+1) for i, t in enumerate(player.tokens) if 0 <= t.position < 40)
         status_lines = status_text.split('\n')
         for i, line in enumerate(status_lines):
-            line_surface = small_font.render(line, True, (0, 0, 0))
-            screen.blit(line_surface, (panel_x + 10, panel_y + 35 + i*18))
+            line_surface = render_text(small_font, line, (0, 0, 0))
+            dirty.append(screen.blit(line_surface, (panel.x + 10, panel.y + 35 + i*18)))
     
     # Draw current player indicator
-    angle = 2 * math.pi * game.current_player / 5 - math.pi/2
-    arrow_x = CENTER[0] + (BOARD_SIZE//2 + 60) * math.cos(angle)
-    arrow_y = CENTER[1] + (BOARD_SIZE//2 + 60) * math.sin(angle)
-    pygame.draw.polygon(screen, PLAYER_COLORS[game.current_player], 
-                       [(arrow_x, arrow_y - 15), (arrow_x + 25, arrow_y), (arrow_x, arrow_y + 15)])
+    dirty.append(pygame.draw.polygon(screen, PLAYER_COLORS[game.current_player], geometry.arrows[game.current_player]))
     
     # Draw dice
-    dice_x, dice_y = WIDTH - 85, HEIGHT - 85
-    pygame.draw.rect(screen, (255, 255, 255), (dice_x - DICE_SIZE//2, dice_y - DICE_SIZE//2, DICE_SIZE, DICE_SIZE), border_radius=5)
-    pygame.draw.rect(screen, (0, 0, 0), (dice_x - DICE_SIZE//2, dice_y - DICE_SIZE//2, DICE_SIZE, DICE_SIZE), 2, border_radius=5)
-    dot_color = (0, 0, 0)
-    if game.dice_roll == 1:
-        pygame.draw.circle(screen, dot_color, (dice_x, dice_y), 5)
-    elif game.dice_roll == 2:
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y - 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y + 10), 5)
-    elif game.dice_roll == 3:
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y - 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x, dice_y), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y + 10), 5)
-    elif game.dice_roll == 4:
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y - 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y + 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y - 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y + 10), 5)
-    elif game.dice_roll == 5:
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y - 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y + 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y - 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y + 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x, dice_y), 5)
-    elif game.dice_roll == 6:
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y - 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x - 10, dice_y + 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y - 10), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y), 5)
-        pygame.draw.circle(screen, dot_color, (dice_x + 10, dice_y + 10), 5)
+    dice_x, dice_y = geometry.width - 85, geometry.height - 85
+    dirty.append(screen.blit(get_dice_face(game.dice_roll), (dice_x - DICE_SIZE//2, dice_y - DICE_SIZE//2)))
     
     # Draw game status
     status_text = f"Player {game.current_player+1}'s Turn"
@@ -449,40 +238,242 @@ def draw_board(game):
         status_text += " (Move Token)"
     elif game.turn_state == "powerup":
         status_text += f" (Use {game.powerup_effect})"
-    status_surface = large_font.render(status_text, True, PLAYER_COLORS[game.current_player])
-    screen.blit(status_surface, (WIDTH//2 - status_surface.get_width()//2, 20))
+    status_surface = render_text(large_font, status_text, PLAYER_COLORS[game.current_player])
+    dirty.append(screen.blit(status_surface, (geometry.width//2 - status_surface.get_width()//2, 20)))
     
     # Draw available moves for human player
     if game.current_player == 0 and game.turn_state == "moving" and game.available_moves:
         moves_text = "Moves: " + ", ".join([f"Token {m[0]+1} ({m[1]})" for m in game.available_moves])
-        moves_surface = font.render(moves_text, True, (0, 0, 0))
-        pygame.draw.rect(screen, (240, 240, 240), (20, HEIGHT - 50, moves_surface.get_width() + 20, 30))
-        screen.blit(moves_surface, (30, HEIGHT - 45))
+        moves_surface = render_text(font, moves_text, (0, 0, 0))
+        dirty.append(pygame.draw.rect(screen, (240, 240, 240), (20, geometry.height - 50, moves_surface.get_width() + 20, 30)))
+        screen.blit(moves_surface, (30, geometry.height - 45))
     
     # Draw winning message
     if game.game_over:
-        overlay = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        overlay.fill((0, 0, 0, 180))
-        screen.blit(overlay, (0, 0))
+        screen.blit(get_overlay(), (0, 0))
         win_text = f"Player {game.winner+1} Wins!"
-        win_surface = large_font.render(win_text, True, PLAYER_COLORS[game.winner])
-        screen.blit(win_surface, (WIDTH//2 - win_surface.get_width()//2, HEIGHT//2 - 30))
+        win_surface = render_text(large_font, win_text, PLAYER_COLORS[game.winner])
+        screen.blit(win_surface, (geometry.width//2 - win_surface.get_width()//2, geometry.height//2 - 30))
         restart_text = "Press R to Restart"
-        restart_surface = font.render(restart_text, True, (255, 255, 255))
-        screen.blit(restart_surface, (WIDTH//2 - restart_surface.get_width()//2, HEIGHT//2 + 20))
+        restart_surface = render_text(font, restart_text, (255, 255, 255))
+        screen.blit(restart_surface, (geometry.width//2 - restart_surface.get_width()//2, geometry.height//2 + 20))
+        full_update = True
+    
+    return None if full_update else dirty
+
+def draw_profile_overlay(averages, last_search):
+    # Rolling averages of the frame phases and the recent AI searches, in the
+    # top-left corner. Returns the rect drawn.
+    lines = [f"frame {averages.mean('frame_ms'):.2f} ms: events {averages.mean('events_ms'):.2f}, "
+             f"ai {averages.mean('ai_ms'):.2f}, draw {averages.mean('draw_ms'):.2f}"]
+    if last_search:
+        lines.append(f"search {averages.mean('search_ms'):.1f} ms, depth {averages.mean('search_depth'):.1f}, "
+                     f"{averages.mean('search_nodes'):.0f} nodes, {averages.mean('search_evaluations'):.0f} evals")
+        lines.append(f"cutoffs/node {averages.mean('search_cutoff_rate'):.2f}, "
+                     f"branching {averages.mean('search_branching'):.2f}")
+        value = last_search["value"]
+        lines.append(f"last: P{last_search['player']+1} {last_search['move']} "
+                     f"value {'-' if value is None else f'{value:.1f}'}")
+    else:
+        lines.append("no AI searches yet")
+    surfaces = [small_font.render(line, True, (255, 255, 255)) for line in lines]
+    width = max(surface.get_width() for surface in surfaces) + 16
+    height = 18 * len(surfaces) + 8
+    rect = pygame.draw.rect(screen, (40, 40, 40), (*PROFILE_POS, width, height))
+    for i, surface in enumerate(surfaces):
+        screen.blit(surface, (PROFILE_POS[0] + 8, PROFILE_POS[1] + 4 + 18 * i))
+    return rect
+
+def draw_replay_status(game_index, games, turn, turns, playing):
+    # Position in the archive, in the top-left corner
+    lines = [f"game {game_index + 1}/{games}  turn {turn}/{turns}" + ("  playing" if playing else ""),
+             "left/right: step  P: play  page up/down: game  esc: quit"]
+    surfaces = [small_font.render(line, True, (255, 255, 255)) for line in lines]
+    width = max(surface.get_width() for surface in surfaces) + 16
+    rect = pygame.draw.rect(screen, (40, 40, 40), (*PROFILE_POS, width, 18 * len(surfaces) + 8))
+    for i, surface in enumerate(surfaces):
+        screen.blit(surface, (PROFILE_POS[0] + 8, PROFILE_POS[1] + 4 + 18 * i))
+    return rect
+
+def add_search_stats(averages, stats):
+    nodes = stats["nodes"]
+    averages.add("search_ms", stats["elapsed_ms"])
+    averages.add("search_depth", stats["depth"])
+    averages.add("search_nodes", nodes)
+    averages.add("search_evaluations", stats["evaluations"])
+    averages.add("search_cutoff_rate", stats["cutoffs"] / nodes if nodes else 0.0)
+    # Effective branching factor: the b for which b ** depth == nodes
+    averages.add("search_branching", nodes ** (1 / stats["depth"]) if stats["depth"] and nodes else 0.0)
+
+class AIWorker:
+    # Runs AI searches on a background thread so the render loop keeps
+    # handling events and drawing while an AI is thinking
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.ai = None
+
+    def busy(self):
+        return self.future is not None
+
+    def start(self, ai, game):
+        # The search runs on a snapshot, so the game can change under it
+        state = CompactState.from_game(game)
+        self.ai = ai
+        self.future = self.executor.submit(ai.choose_move, state, list(game.available_moves))
+
+    def poll(self):
+        # Returns (finished, move)
+        if self.future is None or not self.future.done():
+            return False, None
+        move = self.future.result()
+        self.future = None
+        self.ai = None
+        return True, move
+
+    def cancel(self):
+        if self.future is not None:
+            if not self.future.cancel():
+                self.ai.cancel()
+            self.future = None
+            self.ai = None
+
+    def close(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+
+class FrameStats:
+    # Time spent per frame on events, AI bookkeeping and drawing (not the
+    # clock.tick sleep), split by whether an AI search was running
+    def __init__(self, budget_ms):
+        self.budget_ms = budget_ms
+        self.frames = {True: [], False: []}
+
+    def add(self, frame_ms, thinking):
+        self.frames[thinking].append(frame_ms)
+
+    def summary(self):
+        lines = []
+        for thinking, label in ((False, "idle"), (True, "AI thinking")):
+            frames = sorted(self.frames[thinking])
+            if not frames:
+                continue
+            over = sum(1 for frame in frames if frame > self.budget_ms)
+            lines.append(f"{label}: {len(frames)} frames, avg {sum(frames) / len(frames):.1f} ms, "
+                         f"p99 {frames[int(0.99 * (len(frames) - 1))]:.1f} ms, max {frames[-1]:.1f} ms, "
+                         f"{over} over the {self.budget_ms:.1f} ms budget")
+        return "\n".join(lines)
+
+def replay(path, game_index=0, turn=0):
+    # Steps through the games of a record archive (see ludo_record.py)
+    from ludo_record import GameArchive
+    archive = GameArchive(path)
+    init_display()
+    record = archive.game(game_index)
+    turn = min(turn, len(record))
+    game = record.game_at(turn)
+    playing = False
+    clock = pygame.time.Clock()
+    running = True
+    while running:
+        target = turn
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.VIDEORESIZE:
+                resize_display(event.w, event.h)
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif event.key in (pygame.K_RIGHT, pygame.K_SPACE):
+                    target = turn + 1
+                elif event.key == pygame.K_LEFT:
+                    target = turn - 1
+                elif event.key == pygame.K_HOME:
+                    target = 0
+                elif event.key == pygame.K_END:
+                    target = len(record)
+                elif event.key == pygame.K_p:
+                    playing = not playing
+                elif event.key in (pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                    step = 1 if event.key == pygame.K_PAGEDOWN else -1
+                    game_index = (game_index + step) % len(archive)
+                    record = archive.game(game_index)
+                    turn = target = 0
+                    game = record.new_game()
+        if playing:
+            target = turn + 1
+        target = max(0, min(target, len(record)))
+        if target == turn + 1:
+            record.replay(game, turn)
+        elif target != turn:
+            # Going back replays the game from the start
+            game = record.game_at(target)
+        turn = target
+        if playing and turn == len(record):
+            playing = False
+        draw_board(game)
+        draw_replay_status(game_index, len(archive), turn, len(record), playing)
+        pygame.display.flip()
+        clock.tick(FPS)
+    archive.close()
 
 def main():
+    parser = argparse.ArgumentParser(description="5-player Ludo with AI opponents")
+    parser.add_argument("--stats-log", help="append AI search and frame timing stats to this JSON-lines file")
+    parser.add_argument("--record", help="append every game played to this game record archive")
+    parser.add_argument("--endgame", help="endgame table (see ludo_endgame.py) the AIs look positions up in")
+    parser.add_argument("--replay", help="step through the games of a game record archive instead of playing")
+    parser.add_argument("--game", type=int, default=0, help="with --replay, the game to open")
+    parser.add_argument("--turn", type=int, default=0, help="with --replay, the turn to open the game at")
+    args = parser.parse_args()
+
+    if args.replay:
+        replay(args.replay, args.game, args.turn)
+        return
+    init_display()
+    stats_log = StatsLog(args.stats_log) if args.stats_log else None
     game = LudoGame()
-    ai_players = [AIPlayer(i) for i in range(1, 5)]
+    endgame = None
+    if args.endgame:
+        from ludo_endgame import EndgameTable
+        endgame = EndgameTable(args.endgame)
+    ai_players = [AIPlayer(i, stats_log=stats_log, endgame=endgame) for i in range(1, 5)]
+    recorder = None
+    if args.record:
+        from ludo_record import GameRecordWriter, player_config
+        recorder = GameRecordWriter(args.record)
+        recorder.attach(game, [player_config(None)] + [player_config(ai) for ai in ai_players])
+    worker = AIWorker()
+    frame_stats = FrameStats(1000 / FPS)
+    averages = RollingAverages()
+    last_search = None
+    show_profile = False
     clock = pygame.time.Clock()
+    previous_dirty = None
     running = True
     while running:
+        frame_start = time.perf_counter()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.VIDEORESIZE:
+                resize_display(event.w, event.h)
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and not game.game_over:
+                # Click one of your tokens to move it
+                if game.current_player == 0 and game.turn_state == "moving":
+                    clicked = geometry.token_at(game, *event.pos)
+                    if clicked is not None and clicked[0] == 0:
+                        for move in game.available_moves:
+                            if move[0] == clicked[1]:
+                                game.make_move(0, *move)
+                                break
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_r:
+                    worker.cancel()
                     game.reset_game()
+                elif event.key == pygame.K_F3:
+                    show_profile = not show_profile
                 elif event.key == pygame.K_SPACE and not game.game_over:
                     if game.current_player == 0:
                         if game.turn_state == "rolling":
@@ -491,18 +482,52 @@ def main():
                             game.make_move(0, *game.available_moves[0])
                         elif game.turn_state == "powerup":
                             game.use_powerup(0)
+        events_end = time.perf_counter()
+        thinking = worker.busy()
         if not game.game_over and game.current_player > 0:
             if game.turn_state == "rolling":
                 game.roll_dice()
             elif game.turn_state == "moving":
-                ai_move = ai_players[game.current_player - 1].get_move(game)
-                if ai_move:
-                    game.make_move(game.current_player, *ai_move)
+                if not worker.busy():
+                    worker.start(ai_players[game.current_player - 1], game)
+                else:
+                    finished, ai_move = worker.poll()
+                    if finished:
+                        last_search = ai_players[game.current_player - 1].stats
+                        add_search_stats(averages, last_search)
+                    if finished and ai_move:
+                        game.make_move(game.current_player, *ai_move)
             elif game.turn_state == "powerup":
                 game.use_powerup(game.current_player)
-        draw_board(game)
-        pygame.display.flip()
-        clock.tick(30)
+        ai_end = time.perf_counter()
+        dirty = draw_board(game)
+        if show_profile:
+            profile_rect = draw_profile_overlay(averages, last_search)
+            if dirty is not None:
+                dirty.append(profile_rect)
+        if dirty is None or previous_dirty is None:
+            pygame.display.flip()
+        else:
+            # Areas drawn last frame need repainting with the background too
+            pygame.display.update(previous_dirty + dirty)
+        previous_dirty = dirty
+        frame_end = time.perf_counter()
+        frame = {"frame_ms": 1000 * (frame_end - frame_start), "events_ms": 1000 * (events_end - frame_start),
+                 "ai_ms": 1000 * (ai_end - events_end), "draw_ms": 1000 * (frame_end - ai_end)}
+        for name, value in frame.items():
+            averages.add(name, value)
+        thinking = thinking or worker.busy()
+        frame_stats.add(frame["frame_ms"], thinking)
+        if stats_log is not None:
+            frame["thinking"] = thinking
+            stats_log.record("frame", frame)
+        clock.tick(FPS)
+    worker.close()
+    if stats_log is not None:
+        stats_log.close()
+    if recorder is not None:
+        recorder.close()
+    print(frame_stats.summary())
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
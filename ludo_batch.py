@@ -0,0 +1,189 @@
+import random
+
+import numpy as np
+
+from ludo_engine import (
+    DOUBLE_ROLL_TILE, NORMAL_TILE, NUM_PLAYERS, NUM_TILES, NUM_TOKENS, POWERUP_TILES, RING_OFFSET,
+    SAFE_TILE, SAFE_TILES, AIPlayer,
+)
+
+# Move type codes in the arrays BatchGame.move_types returns
+NO_MOVE, START_MOVE, BOARD_MOVE, HOME_MOVE = 0, 1, 2, 3
+# Added to path positions, shaped like positions[game], to get ring squares
+RING_OFFSETS = (np.arange(NUM_PLAYERS) * RING_OFFSET)[None, :, None]
+
+class BatchGame:
+    # N games of LudoGame held as NumPy arrays and played in lockstep:
+    #   positions[game, player, token]  -1 in base, 0-39 on the path, 40 home
+    #   tokens_home[game, player]
+    #   current_player[game], dice[game], turns[game]
+    #   winner[game]                    -1 while the game is running
+    #   tiles[game, player, tile]       NORMAL_TILE, SAFE_TILE or DOUBLE_ROLL_TILE
+    # Every step() plays one whole turn of each running game (roll, move,
+    # power-up), so between steps all of them are waiting for a dice roll.
+    # turns counts the same actions as selfplay.play_game does.
+    def __init__(self, count, seed=None):
+        self.count = count
+        self.rng = np.random.default_rng(seed)
+        self.reset()
+
+    def reset(self):
+        count = self.count
+        self.positions = np.full((count, NUM_PLAYERS, NUM_TOKENS), -1, dtype=np.int8)
+        self.tokens_home = np.zeros((count, NUM_PLAYERS), dtype=np.int8)
+        self.current_player = np.zeros(count, dtype=np.int8)
+        self.dice = np.ones(count, dtype=np.int8)
+        self.turns = np.zeros(count, dtype=np.int32)
+        self.winner = np.full(count, -1, dtype=np.int8)
+        self.tiles = np.full((count, NUM_PLAYERS, NUM_TILES), NORMAL_TILE, dtype=np.int8)
+        self.tiles[:, :, SAFE_TILES] = SAFE_TILE
+        # One type per power-up ring square, shared by every path through it
+        ring_types = self.rng.choice(np.array([DOUBLE_ROLL_TILE, SAFE_TILE], dtype=np.int8), (count, len(POWERUP_TILES)))
+        for player_id in range(NUM_PLAYERS):
+            squares = [POWERUP_TILES.index((player_id * RING_OFFSET + tile) % NUM_TILES) for tile in POWERUP_TILES]
+            self.tiles[:, player_id, POWERUP_TILES] = ring_types[:, squares]
+
+    def move_types(self, games):
+        # (len(games), NUM_TOKENS) move type of each of the current player's
+        # tokens for the dice already rolled
+        positions = self.positions[games, self.current_player[games]]
+        dice = self.dice[games, None]
+        on_board = (positions >= 0) & (positions < 40)
+        types = np.where(on_board, np.where(positions + dice >= 39, HOME_MOVE, BOARD_MOVE), NO_MOVE)
+        types[(positions == -1) & (dice == 6)] = START_MOVE
+        return types
+
+    def step(self, policies, max_turns=None):
+        # policies[player_id].choose(batch, games, move_types) returns the
+        # token each of those games moves. Returns how many games were played.
+        running = self.winner < 0
+        if max_turns is not None:
+            running &= self.turns < max_turns
+        games = np.flatnonzero(running)
+        if not games.size:
+            return 0
+        players = self.current_player[games]
+        self.dice[games] = self.rng.integers(1, 7, games.size)
+        self.turns[games] += 1
+        types = self.move_types(games)
+        has_move = types.any(axis=1)
+        tokens = np.zeros(games.size, dtype=np.intp)
+        for player_id in range(NUM_PLAYERS):
+            seat = has_move & (players == player_id)
+            if seat.any():
+                tokens[seat] = policies[player_id].choose(self, games[seat], types[seat])
+
+        movers = np.flatnonzero(has_move)
+        games_moved = games[movers]
+        players_moved = players[movers]
+        tokens = tokens[movers]
+        move_type = types[movers, tokens]
+        self.turns[games_moved] += 1
+        old = self.positions[games_moved, players_moved, tokens]
+        new = np.where(move_type == START_MOVE, 0,
+                       np.where(move_type == HOME_MOVE, 40, old + self.dice[games_moved]))
+        self.positions[games_moved, players_moved, tokens] = new
+        landed = move_type == BOARD_MOVE
+        tile = self.tiles[games_moved, players_moved, np.where(landed, new, 0)]
+        capturing = landed & (tile != SAFE_TILE)
+        if capturing.any():
+            self._capture(games_moved[capturing], players_moved[capturing], new[capturing])
+
+        homed = move_type == HOME_MOVE
+        self.tokens_home[games_moved[homed], players_moved[homed]] += 1
+        won = homed & (self.tokens_home[games_moved, players_moved] >= 2)
+        self.winner[games_moved[won]] = players_moved[won]
+        # Only a "move" landing triggers a power-up: a safe zone ends the turn
+        # like a normal tile, a double roll gives the same player another roll
+        powerup = landed & (tile != NORMAL_TILE)
+        self.turns[games_moved[powerup]] += 1
+
+        keep_turn = np.zeros(games.size, dtype=bool)
+        keep_turn[movers[won | (powerup & (tile == DOUBLE_ROLL_TILE))]] = True
+        passing = games[~keep_turn]
+        self.current_player[passing] = (self.current_player[passing] + 1) % NUM_PLAYERS
+        return games.size
+
+    def on_ring(self, games):
+        # (len(games), NUM_PLAYERS, NUM_TOKENS) ring square of every token,
+        # and whether the token is on the ring at all
+        positions = self.positions[games]
+        return (positions + RING_OFFSETS) % NUM_TILES, (positions >= 0) & (positions < 40)
+
+    def _capture(self, games, players, new):
+        # Sends the opponent tokens on each mover's landing square back to base
+        squares, on_board = self.on_ring(games)
+        hit = on_board & (squares == ((new + players * RING_OFFSET) % NUM_TILES)[:, None, None])
+        hit[np.arange(games.size), players] = False
+        positions = self.positions[games]
+        positions[hit] = -1
+        self.positions[games] = positions
+
+    def play(self, policies, max_turns=10000):
+        while self.step(policies, max_turns):
+            pass
+        return self.winner
+
+# Policies choose a move for many games at once (choose) and, for
+# cross-checking the batch engine against LudoGame, for a single game
+# (get_move). When several tokens are equally good the lowest-numbered one
+# moves, as LudoGame lists its moves in token order.
+
+class RandomPolicy:
+    def choose(self, batch, games, move_types):
+        keys = batch.rng.random(move_types.shape)
+        keys[move_types == NO_MOVE] = -1
+        return keys.argmax(axis=1)
+
+    def get_move(self, game):
+        return random.choice(game.available_moves)
+
+class GreedyPolicy:
+    # Bring a token home if possible, else get one out of base, else move the
+    # token furthest along
+    def choose(self, batch, games, move_types):
+        positions = batch.positions[games, batch.current_player[games]]
+        priority = np.where(move_types == HOME_MOVE, 100,
+                            np.where(move_types == START_MOVE, 50, positions.astype(np.int16)))
+        priority[move_types == NO_MOVE] = -100
+        return priority.argmax(axis=1)
+
+    def get_move(self, game):
+        tokens = game.players[game.current_player].tokens
+        def priority(move):
+            if move[1] == "home":
+                return 100
+            if move[1] == "start":
+                return 50
+            return tokens[move[0]].position
+        return max(game.available_moves, key=priority)
+
+class EvaluatePolicy:
+    # AIPlayer.evaluate one ply ahead, which is what AIPlayer(depth=1) plays.
+    # Compared in quarter points: the mover's own score changes by +40 for
+    # leaving base, -dice for a move along the path and +10 - (40 - position)
+    # for reaching home, and every opponent token it captures takes
+    # 40 - position off that opponent's score, which counts a quarter.
+    def choose(self, batch, games, move_types):
+        players = batch.current_player[games]
+        positions = batch.positions[games, players].astype(np.int16)
+        dice = batch.dice[games, None].astype(np.int16)
+        gain = 4 * np.where(move_types == START_MOVE, 40,
+                            np.where(move_types == HOME_MOVE, positions - 30, -dice))
+        board_move = move_types == BOARD_MOVE
+        landing = np.where(board_move, positions + dice, 0)
+        tile = batch.tiles[games[:, None], players[:, None], landing]
+        landing_squares = (landing + players[:, None] * RING_OFFSET) % NUM_TILES
+        squares, on_board = batch.on_ring(games)
+        opponents = on_board & (np.arange(NUM_PLAYERS)[None, :, None] != players[:, None, None])
+        # (games, candidate token, player, token)
+        hit = opponents[:, None] & (squares[:, None] == landing_squares[:, :, None, None])
+        captured = np.where(hit, 40 - batch.positions[games].astype(np.int16)[:, None], 0).sum(axis=(2, 3))
+        gain += np.where(board_move & (tile != SAFE_TILE), captured, 0)
+        gain[move_types == NO_MOVE] = -10000
+        return gain.argmax(axis=1)
+
+    def get_move(self, game):
+        return AIPlayer(game.current_player, depth=1).get_move(game)
+
+POLICIES = {"random": RandomPolicy, "greedy": GreedyPolicy, "evaluate": EvaluatePolicy}
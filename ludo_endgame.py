@@ -0,0 +1,275 @@
+import argparse
+import math
+import mmap
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations_with_replacement
+
+import numpy as np
+
+from ludo_engine import (
+    CUR, DOUBLE_ROLL_TILE, HOME, NUM_PLAYERS, NUM_TILES, NUM_TOKENS, POS, POWERUP_PENDING, POWERUP_TILES,
+    RING_SQUARE, SAFE_TILE, SAFE_TILES, TURN, WINNER,
+)
+
+# Endgame tables: for one player on their own, the exact chance of having
+# two tokens home within t turns, for every way their tokens can stand and
+# every layout of double roll tiles on their path. Turns run to the end of
+# the dice race: a token goes home as soon as it can, and otherwise the
+# player makes the move that minimizes their expected number of turns.
+# Captures are not part of the race, so the win chances built from the
+# tables are exact once the players can no longer reach each other.
+#
+# A player's race position is their tokens home (0 or 1) and the other
+# tokens' path positions + 1 (0 in base, 1-39 on the path), in any order.
+# Positions are numbered with the combinatorial number system: the sorted
+# values v0 <= v1 <= ... get the index sum(comb(v_i + i, i + 1)), which
+# numbers every multiset of a given size without gaps.
+#
+# File layout: TABLE_HEADER, then uint16 chances scaled by CHANCE_SCALE,
+# indexed [layout][race position][turn - 1] for turns 1-MAX_TURNS.
+TABLE_MAGIC = b"LUDOEGT1"
+TABLE_HEADER = struct.Struct("<8sIII")  # magic, layouts, positions, turns
+MAX_TURNS = 96
+CHANCE_SCALE = 65535
+DEFAULT_TABLE_PATH = "endgame.tbl"
+# The race odds are exact once the players can no longer meet (see
+# players_can_meet), which in play hardly ever happens before the game is
+# won: a token still in base can reach almost every square. AIPlayer(endgame=...)
+# therefore also looks positions up, as a heuristic cutoff, once at least
+# this many tokens are home in all. From there on the game is mostly a race,
+# and the race odds beat a depth-2 search.
+ENDGAME_TOKENS_HOME = 3
+# Layout bit i is set when POWERUP_TILES[i] is a double roll tile
+LAYOUTS = 1 << len(POWERUP_TILES)
+PATH_VALUES = NUM_TILES  # position + 1 of a token not home: 0-39
+ONE_HOME_POSITIONS = math.comb(PATH_VALUES + 1, 2)
+NONE_HOME_POSITIONS = math.comb(PATH_VALUES + 2, 3)
+RACE_POSITIONS = ONE_HOME_POSITIONS + NONE_HOME_POSITIONS
+COMB = [[math.comb(n, k) for n in range(PATH_VALUES + NUM_TOKENS)] for k in range(NUM_TOKENS + 1)]
+# Per player and path position + 1 of a token not home, bitmasks of the ring
+# squares the token can still stand on and of those it can still land on
+# with a "move". A token in base enters on its start square.
+FUTURE_SQUARES = [[sum(1 << RING_SQUARE[player_id][square] for square in range(max(value - 1, 0), 39))
+                   for value in range(PATH_VALUES)] for player_id in range(NUM_PLAYERS)]
+FUTURE_LANDINGS = [[sum(1 << RING_SQUARE[player_id][square] for square in range(value, 39))
+                    for value in range(PATH_VALUES)] for player_id in range(NUM_PLAYERS)]
+
+def players_can_meet(state):
+    # True while some token could still land on another player's token on a
+    # square that is not safe, i.e. while a capture is still possible
+    data = state.data
+    tiles = state.tiles
+    # Every path has the same tile type on a ring square, so player 0's tells
+    safe = sum(1 << RING_SQUARE[0][tile] for tile in SAFE_TILES + POWERUP_TILES if tiles[tile] == SAFE_TILE)
+    squares = []
+    landings = []
+    for player_id in range(NUM_PLAYERS):
+        standing = landing = 0
+        for position in data[POS + player_id * NUM_TOKENS:POS + (player_id + 1) * NUM_TOKENS]:
+            if position < 40:
+                standing |= FUTURE_SQUARES[player_id][position + 1]
+                landing |= FUTURE_LANDINGS[player_id][position + 1]
+        squares.append(standing & ~safe)
+        landings.append(landing)
+    for player_id in range(NUM_PLAYERS):
+        for opponent_id in range(NUM_PLAYERS):
+            if opponent_id != player_id and squares[player_id] & landings[opponent_id]:
+                return True
+    return False
+
+def race_index(values, home):
+    # values: the sorted path positions + 1 of the tokens not home
+    index = 0 if home else ONE_HOME_POSITIONS
+    for i, value in enumerate(values):
+        index += COMB[i + 1][value + i]
+    return index
+
+def race_positions():
+    for home in (0, 1):
+        for values in combinations_with_replacement(range(PATH_VALUES), NUM_TOKENS - home):
+            yield home, values
+
+def race_moves(values, home, dice, doubles):
+    # (values, home, extra_roll) after each distinct legal move
+    moves = []
+    for i, value in enumerate(values):
+        if i and value == values[i - 1]:
+            continue
+        rest = values[:i] + values[i + 1:]
+        if value == 0:
+            if dice == 6:
+                moves.append((tuple(sorted(rest + (1,))), home, False))
+        elif value - 1 + dice >= 39:
+            moves.append((rest, home + 1, False))
+        else:
+            position = value - 1 + dice
+            moves.append((tuple(sorted(rest + (position + 1,))), home, position in doubles))
+    return moves
+
+def layout_doubles(layout):
+    return {tile for bit, tile in enumerate(POWERUP_TILES) if layout >> bit & 1}
+
+def build_layout(layout):
+    # Backward induction over one layout. Every move brings a player closer
+    # to home, so positions are solved in decreasing order of progress and
+    # all successors are known by the time a position is reached. A roll
+    # with no legal move passes the turn: chance[t] = a[t] + r * chance[t - 1]
+    # with r = (rolls without a move) / 6, which is a convolution of a with
+    # powers of r.
+    doubles = layout_doubles(layout)
+    chances = np.zeros((RACE_POSITIONS, MAX_TURNS + 1))
+    expected = np.zeros(RACE_POSITIONS)
+    done = np.ones(MAX_TURNS)
+    powers = np.arange(MAX_TURNS)
+    order = sorted(race_positions(), key=lambda position: 41 * position[0] + sum(position[1]), reverse=True)
+    for home, values in order:
+        index = race_index(values, home)
+        total = np.zeros(MAX_TURNS)
+        cost = 0.0
+        stuck = 0
+        for dice in range(1, 7):
+            best = None
+            for next_values, next_home, extra_roll in race_moves(values, home, dice, doubles):
+                if next_home >= 2:
+                    option = (0.0, done)
+                else:
+                    next_index = race_index(next_values, next_home)
+                    if extra_roll:
+                        option = (expected[next_index], chances[next_index, 1:])
+                    else:
+                        option = (1 + expected[next_index], chances[next_index, :-1])
+                if best is None or option[0] < best[0]:
+                    best = option
+            if best is None:
+                stuck += 1
+            else:
+                cost += best[0]
+                total += best[1]
+        expected[index] = (cost + stuck) / (6 - stuck)
+        total /= 6
+        if stuck:
+            total = np.convolve(total, (stuck / 6) ** powers)[:MAX_TURNS]
+        chances[index, 1:] = total
+    return np.round(chances[:, 1:] * CHANCE_SCALE).astype("<u2")
+
+def generate(path, workers=None):
+    # Builds every layout in parallel and writes the table; returns the
+    # file size in bytes
+    with ProcessPoolExecutor(workers) as executor, open(path, "wb") as f:
+        f.write(TABLE_HEADER.pack(TABLE_MAGIC, LAYOUTS, RACE_POSITIONS, MAX_TURNS))
+        for table in executor.map(build_layout, range(LAYOUTS)):
+            f.write(table.tobytes())
+    return os.path.getsize(path)
+
+class EndgameTable:
+    # A generated table, mapped into memory. Probing reads one row of
+    # MAX_TURNS values per player.
+    def __init__(self, path=DEFAULT_TABLE_PATH, min_tokens_home=ENDGAME_TOKENS_HOME):
+        self.min_tokens_home = min_tokens_home
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, layouts, positions, turns = TABLE_HEADER.unpack_from(self.buffer)
+        if magic != TABLE_MAGIC or (layouts, positions, turns) != (LAYOUTS, RACE_POSITIONS, MAX_TURNS):
+            self.close()
+            raise ValueError(f"{path} is not an endgame table for this board")
+        self.chances = np.frombuffer(self.buffer, dtype="<u2", offset=TABLE_HEADER.size).reshape(
+            LAYOUTS, RACE_POSITIONS, MAX_TURNS)
+        self._layouts = {}
+
+    def cutoff(self, state):
+        # True where the AI plays the table's move instead of searching. Only
+        # exact when players_can_meet(state) is False; otherwise the chances
+        # ignore captures and are an estimate.
+        if sum(state.data[HOME:HOME + NUM_PLAYERS]) >= self.min_tokens_home:
+            return True
+        return not players_can_meet(state)
+
+    def layouts(self, tiles):
+        # Layout index of every player's path
+        layouts = self._layouts.get(tiles)
+        if layouts is None:
+            layouts = self._layouts[tiles] = [
+                sum(1 << bit for bit, tile in enumerate(POWERUP_TILES)
+                    if tiles[player_id * NUM_TILES + tile] == DOUBLE_ROLL_TILE)
+                for player_id in range(NUM_PLAYERS)]
+        return layouts
+
+    def finish_chances(self, state, player_id):
+        # Chance that the player has two tokens home within 1-MAX_TURNS of
+        # their own turns, starting with a roll
+        data = state.data
+        base = POS + player_id * NUM_TOKENS
+        values = sorted(position + 1 for position in data[base:base + NUM_TOKENS] if position < 40)
+        row = self.chances[self.layouts(state.tiles)[player_id], race_index(values, data[HOME + player_id])]
+        return row / CHANCE_SCALE
+
+    def win_chances(self, state):
+        # Each player's chance of winning the race from a position where
+        # someone is about to roll. Player i wins on their t-th turn if they
+        # finish on it, the players who roll before them in the round have
+        # not finished in t turns and those who roll after them not in t - 1.
+        data = state.data
+        if data[WINNER] >= 0:
+            chances = np.zeros(NUM_PLAYERS)
+            chances[data[WINNER]] = 1.0
+            return chances
+        # Rows in the order the players roll, starting with the current one
+        order = [(data[CUR] + offset) % NUM_PLAYERS for offset in range(NUM_PLAYERS)]
+        finish = np.zeros((NUM_PLAYERS, MAX_TURNS + 1))
+        for row, player_id in enumerate(order):
+            finish[row, 1:] = self.finish_chances(state, player_id)
+        wins = np.diff(finish, axis=1)
+        # Products over the players before and after each row
+        before = np.cumprod(np.vstack((np.ones(MAX_TURNS), 1 - finish[:-1, 1:])), axis=0)
+        after = np.cumprod(np.vstack((np.ones(MAX_TURNS), 1 - finish[:0:-1, :-1])), axis=0)[::-1]
+        chances = np.zeros(NUM_PLAYERS)
+        chances[order] = (wins * before * after).sum(axis=1)
+        return chances
+
+    def best_move(self, state, moves):
+        # The move that gives the player to move the best chance of winning,
+        # with that chance
+        player_id = state.data[CUR]
+        best = (None, -1.0)
+        for move in moves:
+            undo = state.make_move(*move)
+            if undo is None:
+                continue
+            after = state
+            if state.data[TURN] == POWERUP_PENDING:
+                after = state.copy()
+                after.use_powerup()
+            chance = self.win_chances(after)[player_id]
+            state.unmake_move(undo)
+            if chance > best[1]:
+                best = (move, chance)
+        return best
+
+    def close(self):
+        self.chances = None
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the endgame tables")
+    parser.add_argument("--output", default=DEFAULT_TABLE_PATH)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    size = generate(args.output, args.workers)
+    elapsed = time.perf_counter() - start
+    print(f"{LAYOUTS} layouts x {RACE_POSITIONS} positions x {MAX_TURNS} turns")
+    print(f"wrote {args.output}: {size / 2 ** 20:.1f} MiB in {elapsed:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1147 @@
+import random
+import math
+import time
+from array import array
+
+# Board constants
+PLAYER_COLORS = [(255, 50, 50), (50, 255, 50), (50, 50, 255), (255, 255, 50), (255, 50, 255)]
+NUM_PLAYERS = 5
+NUM_TOKENS = 3
+NUM_TILES = 40
+SAFE_TILES = [0, 8, 16, 24, 32]
+POWERUP_TILES = [5, 13, 21, 29, 37]
+DOUBLE_ROLL = "double_roll"
+SAFE_ZONE = "safe_zone"
+
+# All players walk the same ring of NUM_TILES squares, each starting
+# RING_OFFSET squares after the previous player. A player's path position
+# 0-38 is the ring square RING_SQUARE[player_id][position]; 39 is never
+# stood on, since a roll that reaches it takes the token home.
+RING_OFFSET = NUM_TILES // NUM_PLAYERS
+RING_SQUARE = [[(player_id * RING_OFFSET + position) % NUM_TILES for position in range(NUM_TILES)]
+               for player_id in range(NUM_PLAYERS)]
+# LANDING_MASKS[player_id][square]: bitmask of the ring squares one of that
+# player's tokens on square can land on with a single "move"
+LANDING_MASKS = [[0] * NUM_TILES for _ in range(NUM_PLAYERS)]
+for _player_id in range(NUM_PLAYERS):
+    for _source in range(39):
+        for _position in range(_source + 1, min(_source + 7, 39)):
+            LANDING_MASKS[_player_id][RING_SQUARE[_player_id][_source]] |= 1 << RING_SQUARE[_player_id][_position]
+
+# Compact position layout (see CompactState)
+POS = 0  # NUM_PLAYERS * NUM_TOKENS token positions, indexed player * NUM_TOKENS + token
+HOME = POS + NUM_PLAYERS * NUM_TOKENS  # tokens_home per player
+CUR = HOME + NUM_PLAYERS
+DICE = CUR + 1
+TURN = DICE + 1
+POWERUP = TURN + 1
+WINNER = POWERUP + 1  # -1 while the game is running
+STATE_SIZE = WINNER + 1
+
+TURN_STATES = ["rolling", "moving", "powerup"]
+ROLLING, MOVING, POWERUP_PENDING = 0, 1, 2
+TILE_TYPES = ["normal", SAFE_ZONE, DOUBLE_ROLL]
+NORMAL_TILE, SAFE_TILE, DOUBLE_ROLL_TILE = 0, 1, 2
+
+class Token:
+    def __init__(self):
+        self.position = -1  # -1: home base, 0-39: on board, 40: reached home
+
+class Player:
+    def __init__(self, player_id, color):
+        self.id = player_id
+        self.color = color
+        self.tokens = [Token() for _ in range(NUM_TOKENS)]
+        self.tokens_home = 0
+    
+    def get_score(self):
+        score = self.tokens_home * 10
+        for token in self.tokens:
+            if token.position >= 0:
+                score += (40 - token.position)
+        return score
+
+class LudoGame:
+    def __init__(self):
+        # A ludo_record.GameRecordWriter that is told about every game start
+        # and every turn played
+        self.recorder = None
+        self.reset_game()
+        
+    def reset_game(self):
+        self.board = self.create_board()
+        # Per player, a bitmask of the ring squares their tokens stand on
+        self.occupancy = [0] * NUM_PLAYERS
+        self.players = [Player(i, PLAYER_COLORS[i]) for i in range(NUM_PLAYERS)]
+        self.current_player = 0
+        self.dice_roll = 1
+        self.game_over = False
+        self.winner = None
+        self.turn_state = "rolling"
+        self.available_moves = []
+        self.powerup_effect = None
+        if self.recorder is not None:
+            self.recorder.begin_game(self)
+    
+    def create_board(self):
+        # Every player's power-up tiles fall on the same ring squares, so the
+        # type is drawn once per square and each path takes it from the ring
+        ring_types = {RING_SQUARE[0][tile]: random.choice([DOUBLE_ROLL, SAFE_ZONE]) for tile in POWERUP_TILES}
+        board = []
+        for player_id in range(NUM_PLAYERS):
+            path = []
+            for tile in range(40):
+                if tile in SAFE_TILES:
+                    tile_type = SAFE_ZONE
+                elif tile in POWERUP_TILES:
+                    tile_type = ring_types[RING_SQUARE[player_id][tile]]
+                else:
+                    tile_type = "normal"
+                path.append({"type": tile_type})
+            board.append(path)
+        return board
+    
+    def roll_dice(self, value=None):
+        # value replaces the random roll, e.g. when replaying a recorded game
+        if self.turn_state != "rolling":
+            return False
+        self.dice_roll = random.randint(1, 6) if value is None else value
+        self.turn_state = "moving"
+        self.available_moves = self.get_available_moves(self.current_player)
+        if not self.available_moves:
+            if self.recorder is not None:
+                self.recorder.record_turn(self.current_player, self.dice_roll, -1, None, None)
+            self.next_player()
+            return True
+        return True
+    
+    def get_available_moves(self, player_id):
+        moves = []
+        player = self.players[player_id]
+        for token_id, token in enumerate(player.tokens):
+            if token.position == -1:
+                if self.dice_roll == 6:
+                    moves.append((token_id, "start"))
+            elif 0 <= token.position < 40:
+                new_pos = token.position + self.dice_roll
+                if new_pos >= 39:
+                    moves.append((token_id, "home"))
+                else:
+                    moves.append((token_id, "move"))
+        return moves
+    
+    def make_move(self, player_id, token_id, move_type):
+        dice = self.dice_roll
+        if not self._apply_move(player_id, token_id, move_type):
+            return False
+        if self.recorder is not None:
+            powerup = self.powerup_effect if self.turn_state == "powerup" else None
+            self.recorder.record_turn(player_id, dice, token_id, move_type, powerup)
+            if self.game_over:
+                self.recorder.end_game()
+        return True
+
+    def _apply_move(self, player_id, token_id, move_type):
+        if self.turn_state != "moving":
+            return False
+        player = self.players[player_id]
+        if token_id < 0 or token_id >= len(player.tokens):
+            return False
+        token = player.tokens[token_id]
+        if move_type == "start":
+            if token.position != -1 or self.dice_roll != 6:
+                return False
+            token.position = 0
+            self.occupancy[player_id] |= 1 << RING_SQUARE[player_id][0]
+        elif move_type == "move":
+            if not (0 <= token.position < 40):
+                return False
+            new_pos = token.position + self.dice_roll
+            if new_pos >= 40:
+                return False
+            self._leave_square(player_id, token_id)
+            new_tile = self.board[player_id][new_pos]
+            square = RING_SQUARE[player_id][new_pos]
+            if new_tile["type"] != SAFE_ZONE:
+                self._capture(player_id, square)
+            token.position = new_pos
+            self.occupancy[player_id] |= 1 << square
+            if new_tile["type"] in [DOUBLE_ROLL, SAFE_ZONE]:
+                self.powerup_effect = new_tile["type"]
+                self.turn_state = "powerup"
+                return True
+        elif move_type == "home":
+            if not (0 <= token.position < 40):
+                return False
+            self._leave_square(player_id, token_id)
+            token.position = 40
+            player.tokens_home += 1
+            if player.tokens_home >= 2:
+                self.game_over = True
+                self.winner = player_id
+                return True
+        else:
+            return False
+        if self.turn_state != "powerup":
+            self.next_player()
+        return True
+    
+    def _leave_square(self, player_id, token_id):
+        # Clears the token's square unless another of the player's tokens is
+        # on it too
+        tokens = self.players[player_id].tokens
+        position = tokens[token_id].position
+        if [token.position for token in tokens].count(position) == 1:
+            self.occupancy[player_id] &= ~(1 << RING_SQUARE[player_id][position])
+
+    def _capture(self, player_id, square):
+        # Sends every opponent token on the ring square back to base
+        bit = 1 << square
+        for opponent_id in range(NUM_PLAYERS):
+            if opponent_id != player_id and self.occupancy[opponent_id] & bit:
+                for token in self.players[opponent_id].tokens:
+                    if 0 <= token.position < 40 and RING_SQUARE[opponent_id][token.position] == square:
+                        token.position = -1
+                self.occupancy[opponent_id] &= ~bit
+
+    def use_powerup(self, player_id):
+        if self.turn_state != "powerup":
+            return False
+        if self.powerup_effect == DOUBLE_ROLL:
+            self.turn_state = "rolling"
+            self.powerup_effect = None
+            return True
+        elif self.powerup_effect == SAFE_ZONE:
+            self.next_player()
+            self.powerup_effect = None
+            return True
+        return False
+    
+    def next_player(self):
+        self.current_player = (self.current_player + 1) % 5
+        self.turn_state = "rolling"
+        self.dice_roll = 1
+        self.available_moves = []
+    
+    def get_game_state(self):
+        state = {
+            "current_player": self.current_player,
+            "players": [],
+            "board": self.board,
+            "dice_roll": self.dice_roll,
+            "available_moves": self.available_moves
+        }
+        for player in self.players:
+            player_state = {
+                "id": player.id,
+                "tokens_home": player.tokens_home,
+                "tokens": [token.position for token in player.tokens]
+            }
+            state["players"].append(player_state)
+        return state
+    
+    def apply_game_state(self, state):
+        self.current_player = state["current_player"]
+        self.dice_roll = state["dice_roll"]
+        self.available_moves = state["available_moves"]
+        for player_state in state["players"]:
+            player = self.players[player_state["id"]]
+            player.tokens_home = player_state["tokens_home"]
+            for i, pos in enumerate(player_state["tokens"]):
+                player.tokens[i].position = pos
+        self.occupancy = [0] * NUM_PLAYERS
+        for player in self.players:
+            for token in player.tokens:
+                if 0 <= token.position < 40:
+                    self.occupancy[player.id] |= 1 << RING_SQUARE[player.id][token.position]
+
+# Zobrist keys: one random 64-bit key per (token, position) and per value of
+# each turn-header field. A position's hash is the XOR of the keys that apply.
+_zobrist_rng = random.Random(0x1D0)
+ZOBRIST_TOKENS = [[_zobrist_rng.getrandbits(64) for _ in range(42)] for _ in range(NUM_PLAYERS * NUM_TOKENS)]
+ZOBRIST_PLAYER = [_zobrist_rng.getrandbits(64) for _ in range(NUM_PLAYERS)]
+ZOBRIST_DICE = [_zobrist_rng.getrandbits(64) for _ in range(7)]
+ZOBRIST_TURN = [_zobrist_rng.getrandbits(64) for _ in range(len(TURN_STATES))]
+ZOBRIST_POWERUP = [_zobrist_rng.getrandbits(64) for _ in range(len(TILE_TYPES))]
+ZOBRIST_MAXIMIZING = _zobrist_rng.getrandbits(64)
+
+# Evaluators score a position from one running total per player. Each token
+# adds token_value(player_id, position, tiles) to its player's total, so
+# CompactState can keep the totals up to date as tokens move and evaluating
+# a leaf never has to look at the tokens. A subclass overrides token_value
+# to add features and evaluate to combine the totals differently; one that
+# returns a mask from danger_squares also gets CompactState's per-player
+# danger counts kept up to date.
+class Evaluator:
+    # Tile layouts whose tables are kept
+    CACHE_SIZE = 64
+
+    def __init__(self):
+        self._tables = {}
+        self._bounds = {}
+
+    def __getstate__(self):
+        # Pickled without the caches, e.g. when sent to ludo_parallel workers
+        state = dict(self.__dict__)
+        state["_tables"] = {}
+        state["_bounds"] = {}
+        return state
+
+    def token_value(self, player_id, position, tiles):
+        raise NotImplementedError
+
+    def evaluate(self, state, player_id):
+        totals = state.totals
+        our_score = totals[player_id]
+        return our_score - (sum(totals) - our_score) / 4
+
+    def prepare(self, state):
+        # Makes state keep what evaluate reads up to date as moves are made
+        tables = self.tables(state.tiles)
+        if state.tables is not tables:
+            state.set_tables(tables)
+        unsafe = self.danger_squares(state.tiles)
+        if state.unsafe != unsafe:
+            state.set_danger(unsafe)
+
+    def danger_squares(self, tiles):
+        # Bitmask of the ring squares CompactState.danger counts tokens on, or
+        # None when the counts are not needed
+        return None
+
+    def tables(self, tiles):
+        # Per player, the value of a token at each position, indexed
+        # position + 1. Built once per tile layout.
+        tables = self._tables.get(tiles)
+        if tables is None:
+            if len(self._tables) >= self.CACHE_SIZE:
+                self._tables.clear()
+                self._bounds.clear()
+            tables = self._tables[tiles] = tuple(
+                [self.token_value(player_id, position, tiles) for position in range(-1, 41)]
+                for player_id in range(NUM_PLAYERS))
+        return tables
+
+    def bounds(self, tiles):
+        # (bound, ply_gain, opponent_ply_gain, ply_loss): evaluate() lies in
+        # [-bound, bound], one of our plies raises it by at most ply_gain, an
+        # opponent's ply raises it by at most opponent_ply_gain and any ply
+        # lowers it by at most ply_loss
+        bounds = self._bounds.get(tiles)
+        if bounds is None:
+            bounds = self._bounds[tiles] = self._value_bounds(self.tables(tiles))
+        return bounds
+
+    def _value_bounds(self, tables):
+        # Every change a single token move can make to its player's total,
+        # and the most a player can lose when one of their tokens is captured.
+        # A ply moves one token and may capture every opponent token on the
+        # square it lands on.
+        changes = []
+        for table in tables:
+            changes.append(table[1] - table[0])
+            for position in range(39):
+                for dice in range(1, DICE_FACES + 1):
+                    if position + dice < 39:
+                        changes.append(table[position + dice + 1] - table[position + 1])
+                    else:
+                        changes.append(table[41] - table[position + 1])
+        gain = max(0, max(changes))
+        loss = max(0, -min(changes))
+        capture = max(0, max(table[position + 1] - table[0] for table in tables for position in range(39)))
+        spread = max(max(table) for table in tables) - min(min(table) for table in tables)
+        opponents = NUM_PLAYERS - 1
+        return (NUM_TOKENS * spread,
+                gain + opponents * NUM_TOKENS * capture / 4,
+                (loss + (opponents - 1) * NUM_TOKENS * capture) / 4,
+                max(loss, gain / 4 + NUM_TOKENS * capture))
+
+class ScoreEvaluator(Evaluator):
+    # Player.get_score: 40 - position for a token on the board and 10 for
+    # one that reached home
+    def token_value(self, player_id, position, tiles):
+        if position == 40:
+            return 10
+        if position >= 0:
+            return 40 - position
+        return 0
+
+class SafeTileEvaluator(ScoreEvaluator):
+    # The score plus a bonus for every token standing on a safe zone tile
+    def __init__(self, safe_bonus=5):
+        super().__init__()
+        self.safe_bonus = safe_bonus
+
+    def token_value(self, player_id, position, tiles):
+        value = super().token_value(player_id, position, tiles)
+        if 0 <= position < 40 and tiles[player_id * NUM_TILES + position] == SAFE_TILE:
+            value += self.safe_bonus
+        return value
+
+class DangerEvaluator(ScoreEvaluator):
+    # The score minus a penalty for every square where a player has tokens
+    # that an opponent could capture with one roll. CompactState keeps those
+    # counts up to date as tokens move, so a leaf reads them like the totals.
+    def __init__(self, danger_penalty=5):
+        super().__init__()
+        self.danger_penalty = danger_penalty
+        self._danger_squares = {}
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_danger_squares"] = {}
+        return state
+
+    def danger_squares(self, tiles):
+        # The ring squares that are not safe. Every path has the same tile
+        # type on a ring square, so player 0's path tells.
+        mask = self._danger_squares.get(tiles)
+        if mask is None:
+            if len(self._danger_squares) >= self.CACHE_SIZE:
+                self._danger_squares.clear()
+            mask = self._danger_squares[tiles] = sum(
+                1 << RING_SQUARE[0][tile] for tile in range(NUM_TILES) if tiles[tile] != SAFE_TILE)
+        return mask
+
+    def evaluate(self, state, player_id):
+        danger = state.danger
+        if danger is None:
+            self.prepare(state)
+            danger = state.danger
+        totals = state.totals
+        penalty = self.danger_penalty
+        our_score = totals[player_id] - penalty * danger[player_id]
+        return our_score - (sum(totals) - penalty * sum(danger) - our_score) / 4
+
+    def _value_bounds(self, tables):
+        # Any ply can put up to every token of every player in danger or out
+        # of it, which moves the value by up to NUM_TOKENS penalties for us
+        # and as much again for the opponents' average
+        bound, ply_gain, opponent_ply_gain, ply_loss = super()._value_bounds(tables)
+        swing = 2 * NUM_TOKENS * self.danger_penalty
+        return bound + swing, ply_gain + swing, opponent_ply_gain + swing, ply_loss + swing
+
+EVALUATORS = {"score": ScoreEvaluator, "safe": SafeTileEvaluator, "danger": DangerEvaluator}
+_default_evaluator = ScoreEvaluator()
+
+class CompactState:
+    # A whole position in STATE_SIZE signed bytes. Tile types never change
+    # during a game, so they are shared between states rather than copied.
+    # Kept up to date by every move:
+    #   hash       the Zobrist hash of data
+    #   occupancy  per player, a bitmask of the ring squares they stand on
+    #   totals     per-player evaluator totals for the token value tables in
+    #              tables (ScoreEvaluator's unless an AIPlayer sets its own)
+    # and, once set_danger has been given the squares tokens can be captured
+    # on (unsafe):
+    #   landing    per player, a bitmask of the squares their tokens can land
+    #              on with one roll
+    #   danger     per player, how many squares they stand on in unsafe that
+    #              an opponent can land on
+    # The landing and danger lists are replaced on every move rather than
+    # changed, so undo records and copies can share them.
+    __slots__ = ("data", "tiles", "hash", "occupancy", "tables", "totals", "unsafe", "landing", "danger")
+
+    def __init__(self, data, tiles, tables=None):
+        self.data = data
+        self.tiles = tiles
+        self.unsafe = None
+        self.landing = None
+        self.danger = None
+        self.hash = self.compute_hash()
+        self.occupancy = [0] * NUM_PLAYERS
+        for index in range(POS, HOME):
+            position = data[index]
+            if 0 <= position < 40:
+                player_id = (index - POS) // NUM_TOKENS
+                self.occupancy[player_id] |= 1 << RING_SQUARE[player_id][position]
+        self.set_tables(tables or _default_evaluator.tables(tiles))
+
+    @classmethod
+    def from_game(cls, game):
+        data = array("b", [0] * STATE_SIZE)
+        for player in game.players:
+            for token_id, token in enumerate(player.tokens):
+                data[POS + player.id * NUM_TOKENS + token_id] = token.position
+            data[HOME + player.id] = player.tokens_home
+        data[CUR] = game.current_player
+        data[DICE] = game.dice_roll
+        data[TURN] = TURN_STATES.index(game.turn_state)
+        data[POWERUP] = TILE_TYPES.index(game.powerup_effect) if game.powerup_effect else 0
+        data[WINNER] = game.winner if game.game_over else -1
+        tiles = bytes(TILE_TYPES.index(tile["type"]) for path in game.board for tile in path)
+        return cls(data, tiles)
+
+    def copy(self):
+        state = CompactState.__new__(CompactState)
+        state.data = array("b", self.data)
+        state.tiles = self.tiles
+        state.hash = self.hash
+        state.occupancy = self.occupancy[:]
+        state.tables = self.tables
+        state.totals = self.totals[:]
+        state.unsafe = self.unsafe
+        state.landing = self.landing
+        state.danger = self.danger
+        return state
+
+    def set_tables(self, tables):
+        self.tables = tables
+        data = self.data
+        self.totals = [sum(tables[player_id][data[POS + player_id * NUM_TOKENS + token_id] + 1]
+                           for token_id in range(NUM_TOKENS))
+                       for player_id in range(NUM_PLAYERS)]
+
+    def set_danger(self, unsafe):
+        self.unsafe = unsafe
+        if unsafe is None:
+            self.landing = self.danger = None
+            return
+        self.landing = [self._landing_mask(player_id) for player_id in range(NUM_PLAYERS)]
+        self._count_danger()
+
+    def _landing_mask(self, player_id):
+        mask = 0
+        squares = self.occupancy[player_id]
+        masks = LANDING_MASKS[player_id]
+        while squares:
+            low = squares & -squares
+            mask |= masks[low.bit_length() - 1]
+            squares ^= low
+        return mask
+
+    def _count_danger(self):
+        landing = self.landing
+        occupancy = self.occupancy
+        unsafe = self.unsafe
+        # Each player is in danger from the players before and after them
+        after = [0] * NUM_PLAYERS
+        for player_id in range(NUM_PLAYERS - 1, 0, -1):
+            after[player_id - 1] = after[player_id] | landing[player_id]
+        before = 0
+        danger = []
+        for player_id in range(NUM_PLAYERS):
+            danger.append(bin(occupancy[player_id] & (before | after[player_id]) & unsafe).count("1"))
+            before |= landing[player_id]
+        self.danger = danger
+
+    def compute_hash(self):
+        data = self.data
+        key = self._header_key()
+        for index in range(POS, HOME):
+            key ^= ZOBRIST_TOKENS[index][data[index] + 1]
+        return key
+
+    def _header_key(self):
+        data = self.data
+        return ZOBRIST_PLAYER[data[CUR]] ^ ZOBRIST_DICE[data[DICE]] ^ ZOBRIST_TURN[data[TURN]] ^ ZOBRIST_POWERUP[data[POWERUP]]
+
+    def get_available_moves(self):
+        data = self.data
+        dice = data[DICE]
+        base = POS + data[CUR] * NUM_TOKENS
+        moves = []
+        for token_id in range(NUM_TOKENS):
+            position = data[base + token_id]
+            if position == -1:
+                if dice == 6:
+                    moves.append((token_id, "start"))
+            elif position < 40:
+                if position + dice >= 39:
+                    moves.append((token_id, "home"))
+                else:
+                    moves.append((token_id, "move"))
+        return moves
+
+    # make_move, roll and use_powerup return an undo record for unmake_move,
+    # or None if the action is not legal in this position. Only the moved
+    # token, any tokens it captures and the turn header are touched.
+    def make_move(self, token_id, move_type):
+        data = self.data
+        if data[TURN] != MOVING:
+            return None
+        player_id = data[CUR]
+        index = POS + player_id * NUM_TOKENS + token_id
+        position = data[index]
+        if move_type == "start":
+            if position != -1 or data[DICE] != 6:
+                return None
+            new_pos = 0
+        elif move_type == "move":
+            if not (0 <= position < 40):
+                return None
+            new_pos = position + data[DICE]
+            if new_pos >= 40:
+                return None
+        elif move_type == "home":
+            if not (0 <= position < 40):
+                return None
+            new_pos = 40
+        else:
+            return None
+        totals = self.totals
+        occupancy = self.occupancy
+        undo_state = (data[HOME:], self.hash, totals[:], occupancy[:])
+        captured = ()
+        tokens_key = ZOBRIST_TOKENS[index]
+        key = self.hash ^ self._header_key() ^ tokens_key[position + 1] ^ tokens_key[new_pos + 1]
+        ring = RING_SQUARE[player_id]
+        base = POS + player_id * NUM_TOKENS
+        if position >= 0 and data[base:base + NUM_TOKENS].count(position) == 1:
+            occupancy[player_id] &= ~(1 << ring[position])
+        data[index] = new_pos
+        table = self.tables[player_id]
+        totals[player_id] += table[new_pos + 1] - table[position + 1]
+        if new_pos < 40:
+            if move_type == "move" and self.tiles[player_id * NUM_TILES + new_pos] != SAFE_TILE:
+                captured = self._capture(player_id, ring[new_pos])
+                for captured_index, captured_pos in captured:
+                    key ^= ZOBRIST_TOKENS[captured_index][captured_pos + 1] ^ ZOBRIST_TOKENS[captured_index][0]
+            occupancy[player_id] |= 1 << ring[new_pos]
+        undo_danger = (self.landing, self.danger)
+        if self.unsafe is not None:
+            landing = self.landing[:]
+            landing[player_id] = self._landing_mask(player_id)
+            for captured_index, _ in captured:
+                opponent_id = (captured_index - POS) // NUM_TOKENS
+                landing[opponent_id] = self._landing_mask(opponent_id)
+            self.landing = landing
+            self._count_danger()
+        if move_type == "home":
+            data[HOME + player_id] += 1
+            if data[HOME + player_id] >= 2:
+                data[WINNER] = player_id
+            else:
+                self._next_player()
+        elif move_type == "move" and self.tiles[player_id * NUM_TILES + new_pos] != NORMAL_TILE:
+            data[POWERUP] = self.tiles[player_id * NUM_TILES + new_pos]
+            data[TURN] = POWERUP_PENDING
+        else:
+            self._next_player()
+        self.hash = key ^ self._header_key()
+        return (index, position) + undo_state + (captured,) + undo_danger
+
+    def _capture(self, player_id, square):
+        # Sends every opponent token on the ring square back to base and
+        # returns their (index, old position) pairs
+        data = self.data
+        occupancy = self.occupancy
+        bit = 1 << square
+        captured = []
+        for opponent_id in range(NUM_PLAYERS):
+            if opponent_id != player_id and occupancy[opponent_id] & bit:
+                ring = RING_SQUARE[opponent_id]
+                table = self.tables[opponent_id]
+                for index in range(POS + opponent_id * NUM_TOKENS, POS + (opponent_id + 1) * NUM_TOKENS):
+                    position = data[index]
+                    if 0 <= position < 40 and ring[position] == square:
+                        captured.append((index, position))
+                        data[index] = -1
+                        self.totals[opponent_id] += table[0] - table[position + 1]
+                occupancy[opponent_id] &= ~bit
+        return captured
+
+    def roll(self, value):
+        data = self.data
+        if data[TURN] != ROLLING:
+            return None
+        undo = (-1, 0, data[HOME:], self.hash, None, None, (), None, None)
+        key = self.hash ^ self._header_key()
+        data[DICE] = value
+        data[TURN] = MOVING
+        if not self.get_available_moves():
+            self._next_player()
+        self.hash = key ^ self._header_key()
+        return undo
+
+    def use_powerup(self):
+        data = self.data
+        if data[TURN] != POWERUP_PENDING:
+            return None
+        undo = (-1, 0, data[HOME:], self.hash, None, None, (), None, None)
+        key = self.hash ^ self._header_key()
+        if data[POWERUP] == DOUBLE_ROLL_TILE:
+            data[TURN] = ROLLING
+        else:
+            self._next_player()
+        data[POWERUP] = 0
+        self.hash = key ^ self._header_key()
+        return undo
+
+    def unmake_move(self, undo):
+        index, position, header, key, totals, occupancy, captured, landing, danger = undo
+        data = self.data
+        if index >= 0:
+            data[index] = position
+            for captured_index, captured_pos in captured:
+                data[captured_index] = captured_pos
+            self.totals = totals
+            self.occupancy = occupancy
+            self.landing = landing
+            self.danger = danger
+        data[HOME:] = header
+        self.hash = key
+
+    def _next_player(self):
+        data = self.data
+        data[CUR] = (data[CUR] + 1) % NUM_PLAYERS
+        data[TURN] = ROLLING
+        data[DICE] = 1
+
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+class TranspositionTable:
+    # Fixed number of buckets with two entries each: the first keeps the
+    # deepest search seen for that bucket, the second is always overwritten.
+    # Entries are (hash, depth, flag, value, best move) tuples.
+    def __init__(self, size):
+        buckets = 1
+        while buckets < size:
+            buckets <<= 1
+        self.mask = buckets - 1
+        self.entries = [None] * (2 * buckets)
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+
+    def clear(self):
+        self.entries = [None] * len(self.entries)
+
+    def probe(self, key, depth, alpha, beta):
+        # Returns (value, move). value is None unless the stored result is deep
+        # enough and settles the node for this window; move is the best move
+        # found last time, for searching first.
+        self.probes += 1
+        index = (key & self.mask) << 1
+        entry = self.entries[index]
+        if entry is None or entry[0] != key:
+            entry = self.entries[index + 1]
+            if entry is None or entry[0] != key:
+                return None, None
+        self.hits += 1
+        _, entry_depth, flag, value, move = entry
+        if entry_depth >= depth and (flag == EXACT or (flag == LOWER_BOUND and value >= beta)
+                                     or (flag == UPPER_BOUND and value <= alpha)):
+            self.cutoffs += 1
+            return value, move
+        return None, move
+
+    def store(self, key, depth, alpha, beta, value, move):
+        # alpha and beta are the window the node was searched with, which
+        # tells whether a fail-soft value is exact or only a bound
+        if value <= alpha:
+            flag = UPPER_BOUND
+        elif value >= beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        self.stores += 1
+        index = (key & self.mask) << 1
+        deepest = self.entries[index]
+        if deepest is None or deepest[0] == key or depth >= deepest[1]:
+            self.entries[index] = (key, depth, flag, value, move)
+        else:
+            self.entries[index + 1] = (key, depth, flag, value, move)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
+
+# Search modes for AIPlayer. "minimax" is the original fixed-dice search;
+# the others model every roll as a chance node. "expectimax" expands all six
+# outcomes, "star1" prunes chance nodes with value bounds and "star2" also
+# probes one move per outcome first to tighten those bounds.
+SEARCH_MODES = ["minimax", "expectimax", "star1", "star2"]
+DICE_FACES = 6
+
+PROBE_WINDOW = 1e-6
+
+# Iterative deepening stops here even if there is time left
+MAX_SEARCH_DEPTH = 32
+# How many nodes are searched between two looks at the clock
+DEADLINE_CHECK_NODES = 64
+# Root moves whose value is at least this far below the best one found so far
+# are dropped without an exact value. Keeping the margin above zero means
+# ties with the best move are still resolved exactly, in root move order.
+TIE_MARGIN = 1e-9
+
+class SearchTimeout(Exception):
+    pass
+
+class AIPlayer:
+    def __init__(self, player_id, depth=2, search="minimax", tt_size=0, pool=None, time_budget_ms=None,
+                 stats_log=None, evaluator=None, endgame=None):
+        if search not in SEARCH_MODES:
+            raise ValueError(f"unknown search mode {search!r}")
+        self.player_id = player_id
+        self.depth = depth
+        self.search = search
+        self.tt_size = tt_size
+        self.nodes = 0
+        self.cutoffs = 0
+        self.evaluations = 0
+        self.evaluator = evaluator or _default_evaluator
+        # The table is kept across turns; its entries stay valid for as long
+        # as the tile layout is the same
+        self.tt = TranspositionTable(tt_size) if tt_size else None
+        self._tt_tiles = None
+        # A ludo_parallel.SearchPool to spread the root moves over processes
+        self.pool = pool
+        # With a time budget get_move deepens iteratively instead of
+        # searching to a fixed depth
+        self.time_budget_ms = time_budget_ms
+        self.deadline = None
+        self.stats = {}
+        # A ludo_profile.StatsLog that receives self.stats after every move
+        self.stats_log = stats_log
+        self.cancelled = False
+        self._root_best = None
+        # A ludo_endgame.EndgameTable; positions past its cutoff are looked
+        # up instead of searched, which is a heuristic while captures are
+        # still possible
+        self.endgame = endgame
+    
+    def begin_search(self, state):
+        self.nodes = 0
+        self.cutoffs = 0
+        self.evaluations = 0
+        self.evaluator.prepare(state)
+        if self.tt is not None and state.tiles != self._tt_tiles:
+            self.tt.clear()
+            self._tt_tiles = state.tiles
+
+    def get_move(self, game, budget_ms=None):
+        return self.choose_move(CompactState.from_game(game), game.available_moves, budget_ms)
+
+    def choose_move(self, state, moves, budget_ms=None):
+        # budget_ms (or time_budget_ms) caps the wall-clock time of the search,
+        # with or without a pool. Endgame positions are a table lookup and do
+        # not search at all.
+        self.cancelled = False
+        if budget_ms is None:
+            budget_ms = self.time_budget_ms
+        start = time.perf_counter()
+        if self.endgame is not None and self.endgame.cutoff(state):
+            self.nodes = self.cutoffs = self.evaluations = 0
+            best_move, chance = self.endgame.best_move(state, moves)
+            self._record_stats(start, 0, chance, best_move, False, [])
+            return best_move
+        self.begin_search(state)
+        if budget_ms is not None:
+            return self._iterative_deepening(state, list(moves), start, budget_ms)
+        # No deadline, but keep looking at the clock so cancel() can stop us
+        self.deadline = math.inf
+        timed_out = False
+        try:
+            best_move, best_value = self._search_root(state, moves, self.depth)
+        except SearchTimeout:
+            best_move, best_value, timed_out = self._root_best, None, True
+        finally:
+            self.deadline = None
+        self._record_stats(start, self.depth, best_value, best_move, timed_out, [])
+        return best_move
+
+    def _record_stats(self, start, depth, value, move, timed_out, iterations):
+        # iterations holds (depth, nodes, elapsed_ms) for each completed
+        # iterative deepening pass
+        self.stats = {"player": self.player_id, "search": self.search, "depth": depth, "nodes": self.nodes,
+                      "cutoffs": self.cutoffs, "evaluations": self.evaluations, "value": value, "move": move,
+                      "elapsed_ms": 1000 * (time.perf_counter() - start), "timed_out": timed_out,
+                      "iterations": iterations}
+        if self.stats_log is not None:
+            self.stats_log.record("search", self.stats)
+
+    def cancel(self):
+        # Stops a search running on another thread at its next clock check
+        self.cancelled = True
+
+    def _iterative_deepening(self, state, moves, start, budget_ms):
+        self.deadline = start + budget_ms / 1000
+        best_move = moves[0] if moves else None
+        best_value = None
+        depth_reached = 0
+        timed_out = False
+        iterations = []
+        try:
+            for depth in range(1, MAX_SEARCH_DEPTH + 1):
+                if len(moves) <= 1:
+                    break
+                iteration_start = time.perf_counter()
+                iteration_nodes = self.nodes
+                best_move, best_value = self._search_root(state, moves, depth)
+                depth_reached = depth
+                now = time.perf_counter()
+                iterations.append((depth, self.nodes - iteration_nodes, 1000 * (now - iteration_start)))
+                # Search the last best move first in the next iteration
+                moves.remove(best_move)
+                moves.insert(0, best_move)
+                if now + (now - iteration_start) > self.deadline:
+                    break
+        except SearchTimeout:
+            timed_out = True
+            if depth_reached == 0 and self._root_best is not None:
+                best_move = self._root_best
+        finally:
+            self.deadline = None
+        self._record_stats(start, depth_reached, best_value, best_move, timed_out, iterations)
+        return best_move
+
+    def _search_root(self, state, moves, depth):
+        if self.pool is None:
+            return self.search_root(state, moves, depth)
+        # Worker processes have their own clocks, so they get the deadline as
+        # wall-clock time
+        deadline = None if self.deadline == math.inf else time.time() + self.deadline - time.perf_counter()
+        return self.pool.search_root(self, state, moves, depth, deadline)
+
+    def search_root(self, state, moves, depth):
+        # Every root move is searched with the best value so far as alpha: a
+        # move that cannot beat it fails low and a tie keeps the earlier move
+        best_move = None
+        best_value = -math.inf
+        self._root_best = None
+        for move in moves:
+            undo = state.make_move(move[0], move[1])
+            if undo is None:
+                continue
+            if self.search == "minimax":
+                value = self.minimax(state, depth - 1, best_value, math.inf, False)
+            else:
+                value = self.expectimax(state, depth - 1, best_value, math.inf)
+            state.unmake_move(undo)
+            if value > best_value:
+                best_value = value
+                best_move = move
+                self._root_best = move
+        return best_move, best_value
+    
+    def minimax(self, state, depth, alpha, beta, is_maximizing):
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes % DEADLINE_CHECK_NODES:
+            if self.cancelled or time.perf_counter() > self.deadline:
+                raise SearchTimeout
+        data = state.data
+        if depth == 0 or data[WINNER] >= 0:
+            return self.evaluate(state)
+        # Power-ups and dice are forced steps: a pending power-up is used
+        # straight away and the player to move "rolls" the dice value already
+        # in the position
+        if data[TURN] == POWERUP_PENDING:
+            undo = state.use_powerup()
+            value = self.minimax(state, depth, alpha, beta, is_maximizing)
+            state.unmake_move(undo)
+            return value
+        if data[TURN] == ROLLING:
+            undo = state.roll(data[DICE])
+            if data[TURN] == ROLLING:
+                # No legal move, the turn passed: count it as a ply
+                value = self.minimax(state, depth - 1, alpha, beta, not is_maximizing)
+            else:
+                value = self.minimax(state, depth, alpha, beta, is_maximizing)
+            state.unmake_move(undo)
+            return value
+        tt = self.tt
+        tt_move = None
+        if tt is not None:
+            key = state.hash ^ (ZOBRIST_MAXIMIZING if is_maximizing else 0)
+            value, tt_move = tt.probe(key, depth, alpha, beta)
+            if value is not None:
+                return value
+        moves = self._ordered_moves(state, tt_move)
+        alpha_in, beta_in = alpha, beta
+        best_move = None
+        current_player_id = data[CUR]
+        is_current_player = (current_player_id == self.player_id)
+        if is_current_player or is_maximizing:
+            max_eval = -math.inf
+            for move in moves:
+                undo = state.make_move(move[0], move[1])
+                eval = self.minimax(state, depth - 1, alpha, beta, False)
+                state.unmake_move(undo)
+                if eval > max_eval:
+                    max_eval = eval
+                    best_move = move
+                alpha = max(alpha, eval)
+                if beta <= alpha:
+                    self.cutoffs += 1
+                    break
+            value = max_eval
+        else:
+            min_eval = math.inf
+            for move in moves:
+                undo = state.make_move(move[0], move[1])
+                eval = self.minimax(state, depth - 1, alpha, beta, True)
+                state.unmake_move(undo)
+                if eval < min_eval:
+                    min_eval = eval
+                    best_move = move
+                beta = min(beta, eval)
+                if beta <= alpha:
+                    self.cutoffs += 1
+                    break
+            value = min_eval
+        if tt is not None:
+            tt.store(key, depth, alpha_in, beta_in, value, best_move)
+        return value
+    
+    def expectimax(self, state, depth, alpha, beta):
+        # Paranoid expectimax: we maximize, every opponent minimizes and each
+        # roll is a chance node. Fail-soft: a result <= alpha is an upper
+        # bound and a result >= beta is a lower bound.
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes % DEADLINE_CHECK_NODES:
+            if self.cancelled or time.perf_counter() > self.deadline:
+                raise SearchTimeout
+        data = state.data
+        if depth == 0 or data[WINNER] >= 0:
+            return self.evaluate(state)
+        if data[TURN] == POWERUP_PENDING:
+            undo = state.use_powerup()
+            value = self.expectimax(state, depth, alpha, beta)
+            state.unmake_move(undo)
+            return value
+        tt = self.tt
+        tt_move = None
+        if tt is not None:
+            value, tt_move = tt.probe(state.hash, depth, alpha, beta)
+            if value is not None:
+                return value
+        best_move = None
+        if data[TURN] == ROLLING:
+            if self.search == "expectimax":
+                value = self._expand_chance(state, depth)
+            else:
+                value = self._star_chance(state, depth, alpha, beta)
+        else:
+            value, best_move = self._decision(state, depth, alpha, beta, self._ordered_moves(state, tt_move))
+        if tt is not None:
+            tt.store(state.hash, depth, alpha, beta, value, best_move)
+        return value
+
+    def _ordered_moves(self, state, first=None):
+        moves = state.get_available_moves()
+        if first is not None and first in moves and moves[0] != first:
+            moves.remove(first)
+            moves.insert(0, first)
+        return moves
+
+    def _decision(self, state, depth, alpha, beta, moves):
+        best_move = None
+        if state.data[CUR] == self.player_id:
+            best = -math.inf
+            for move in moves:
+                undo = state.make_move(move[0], move[1])
+                value = self.expectimax(state, depth - 1, alpha, beta)
+                state.unmake_move(undo)
+                if value > best:
+                    best = value
+                    best_move = move
+                    if best > alpha:
+                        alpha = best
+                        if alpha >= beta:
+                            self.cutoffs += 1
+                            break
+        else:
+            best = math.inf
+            for move in moves:
+                undo = state.make_move(move[0], move[1])
+                value = self.expectimax(state, depth - 1, alpha, beta)
+                state.unmake_move(undo)
+                if value < best:
+                    best = value
+                    best_move = move
+                    if best < beta:
+                        beta = best
+                        if alpha >= beta:
+                            self.cutoffs += 1
+                            break
+        return best, best_move
+
+    def roll_child(self, state, depth, alpha, beta):
+        # Value of the position right after a roll. A roll with no legal
+        # move passes the turn, which counts as a ply.
+        if state.data[TURN] == ROLLING:
+            return self.expectimax(state, depth - 1, alpha, beta)
+        return self.expectimax(state, depth, alpha, beta)
+
+    def _expand_chance(self, state, depth):
+        total = 0.0
+        for roll in range(1, DICE_FACES + 1):
+            undo = state.roll(roll)
+            total += self.roll_child(state, depth, -math.inf, math.inf)
+            state.unmake_move(undo)
+        return total / DICE_FACES
+
+    def _star_chance(self, state, depth, alpha, beta):
+        n = DICE_FACES
+        bound_lower, bound_upper = self.value_bounds(state, depth)
+        lower = [bound_lower] * n
+        upper = [bound_upper] * n
+        maximizing = state.data[CUR] == self.player_id
+        if self.search == "star2":
+            # Probing: searching just the first move of each outcome gives a
+            # lower bound on a max node (upper bound on a min node), which may
+            # already be enough to cut the whole chance node. Each probe runs
+            # with a null window around the cutoff threshold
+            for i in range(n):
+                if maximizing:
+                    threshold = n * beta - (sum(lower) - lower[i])
+                    if threshold > bound_upper:
+                        continue
+                else:
+                    threshold = n * alpha - (sum(upper) - upper[i])
+                    if threshold < bound_lower:
+                        continue
+                undo = state.roll(i + 1)
+                if state.data[TURN] == MOVING:
+                    move = state.get_available_moves()[0]
+                    move_undo = state.make_move(move[0], move[1])
+                    if maximizing:
+                        value = self.expectimax(state, depth - 1, threshold - PROBE_WINDOW, threshold)
+                        if value >= threshold:
+                            lower[i] = value
+                    else:
+                        value = self.expectimax(state, depth - 1, threshold, threshold + PROBE_WINDOW)
+                        if value <= threshold:
+                            upper[i] = value
+                    state.unmake_move(move_undo)
+                state.unmake_move(undo)
+                if maximizing and sum(lower) >= n * beta:
+                    return sum(lower) / n
+                if not maximizing and sum(upper) <= n * alpha:
+                    return sum(upper) / n
+        # Star1: search each outcome with the window that could still move
+        # the chance node's value across alpha or beta
+        for i in range(n):
+            if sum(upper) <= n * alpha:
+                return sum(upper) / n
+            if sum(lower) >= n * beta:
+                return sum(lower) / n
+            if lower[i] == upper[i]:
+                continue
+            window_alpha = n * alpha - (sum(upper) - upper[i])
+            window_beta = n * beta - (sum(lower) - lower[i])
+            undo = state.roll(i + 1)
+            value = self.roll_child(state, depth, max(window_alpha, lower[i]), min(window_beta, upper[i]))
+            state.unmake_move(undo)
+            if value <= window_alpha:
+                return (sum(upper) - upper[i] + value) / n
+            if value >= window_beta:
+                return (sum(lower) - lower[i] + value) / n
+            lower[i] = upper[i] = value
+        return sum(lower) / n
+
+    def value_bounds(self, state, depth):
+        # Range of values reachable from this position in depth plies; the
+        # tighter it is, the earlier star1/star2 can cut a chance node
+        value = self.evaluate(state)
+        bound, ply_gain, opponent_ply_gain, ply_loss = self.evaluator.bounds(state.tiles)
+        # Turns pass in seat order (a double roll only repeats a seat), so we
+        # cannot move before the players seated ahead of us have
+        our_plies = max(0, depth - (self.player_id - state.data[CUR]) % NUM_PLAYERS)
+        upper = value + our_plies * ply_gain + (depth - our_plies) * opponent_ply_gain
+        return max(value - depth * ply_loss, -bound), min(upper, bound)
+
+    def evaluate(self, state):
+        self.evaluations += 1
+        return self.evaluator.evaluate(state, self.player_id)
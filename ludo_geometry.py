@@ -0,0 +1,155 @@
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from ludo_engine import NUM_PLAYERS, NUM_TILES, NUM_TOKENS
+
+# Layout constants
+WIDTH, HEIGHT = 950, 750
+BOARD_SIZE = 400
+CENTER = (WIDTH // 2, HEIGHT // 2)
+TOKEN_RADIUS = 16
+MIN_RADIUS = BOARD_SIZE // 2 - 100
+MAX_RADIUS = BOARD_SIZE // 2
+TILE_HALF_SIZE = 13
+HOME_RADIUS = 45
+SEGMENT_LENGTH = 8
+# Side of the square cells the hit-test index buckets shapes into
+HIT_CELL_SIZE = 32
+
+def get_pentagon_point(center, radius, point_idx):
+    angle = 2 * math.pi * point_idx / 5 - math.pi/2
+    x = center[0] + radius * math.cos(angle)
+    y = center[1] + radius * math.sin(angle)
+    return (x, y)
+
+class BoardGeometry:
+    # Screen coordinates of everything draw_board places, computed once per
+    # window size instead of on every frame:
+    #   tiles[player_id][tile_idx]   tile centers (ints)
+    #   home_bases[player_id]        home base centers (ints)
+    #   base_slots[player_id][token] where tokens wait in a home base
+    #   home_slots[player_id]        where tokens that reached home are drawn
+    #   arrows[player_id]            current-player indicator polygons
+    #   home_area, board_outline     the two pentagons
+    # plus a grid index for mapping mouse positions to tiles and base slots.
+    def __init__(self, width=WIDTH, height=HEIGHT, scale=1.0, use_numpy=None):
+        self.configure(width, height, scale, use_numpy)
+
+    def configure(self, width, height, scale=1.0, use_numpy=None):
+        # Call again when the window is resized or the board rescaled
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.center = (width // 2, height // 2)
+        self.board_size = BOARD_SIZE * scale
+        self.min_radius = MIN_RADIUS * scale
+        self.max_radius = MAX_RADIUS * scale
+        self.tile_half_size = TILE_HALF_SIZE * scale
+        self.token_radius = TOKEN_RADIUS * scale
+        self.home_radius = HOME_RADIUS * scale
+        self.tiles = self._numpy_tile_table() if use_numpy else self._tile_table()
+        self.home_area = [get_pentagon_point(self.center, 60 * scale, i) for i in range(5)]
+        self.board_outline = [get_pentagon_point(self.center, self.board_size // 2, i) for i in range(5)]
+        self.home_bases = []
+        self.base_slots = []
+        self.home_slots = []
+        self.arrows = []
+        for player_id in range(NUM_PLAYERS):
+            angle = 2 * math.pi * player_id / 5 - math.pi/2
+            home_distance = self.board_size // 2 + 70 * scale
+            home_pos = (int(self.center[0] + home_distance * math.cos(angle)),
+                        int(self.center[1] + home_distance * math.sin(angle)))
+            self.home_bases.append(home_pos)
+            slots = []
+            for token_idx in range(NUM_TOKENS):
+                token_angle = 2 * math.pi * token_idx / NUM_TOKENS
+                slots.append((home_pos[0] + 25 * scale * math.cos(token_angle),
+                              home_pos[1] + 25 * scale * math.sin(token_angle)))
+            self.base_slots.append(slots)
+            self.home_slots.append(get_pentagon_point(self.center, 30 * scale, player_id))
+            arrow_distance = self.board_size // 2 + 60 * scale
+            arrow_x = self.center[0] + arrow_distance * math.cos(angle)
+            arrow_y = self.center[1] + arrow_distance * math.sin(angle)
+            self.arrows.append([(arrow_x, arrow_y - 15 * scale), (arrow_x + 25 * scale, arrow_y),
+                                (arrow_x, arrow_y + 15 * scale)])
+        self._build_hit_index()
+
+    def _tile_table(self):
+        tiles = []
+        for player_id in range(NUM_PLAYERS):
+            player_angle = 2 * math.pi * player_id / 5 - math.pi / 2
+            path = []
+            for tile_idx in range(NUM_TILES):
+                segment = tile_idx // SEGMENT_LENGTH
+                segment_pos = tile_idx % SEGMENT_LENGTH
+                start_angle = player_angle + (2 * math.pi / 5) * segment
+                end_angle = player_angle + (2 * math.pi / 5) * (segment + 1)
+                t = segment_pos / SEGMENT_LENGTH
+                angle = start_angle * (1 - t) + end_angle * t
+                radius = self.min_radius + (self.max_radius - self.min_radius) * abs(t - 0.5) * 2
+                x = self.center[0] + radius * math.cos(angle)
+                y = self.center[1] + radius * math.sin(angle)
+                path.append((int(x), int(y)))
+            tiles.append(path)
+        return tiles
+
+    def _numpy_tile_table(self):
+        player_angle = 2 * numpy.pi * numpy.arange(NUM_PLAYERS)[:, None] / 5 - numpy.pi / 2
+        tile_idx = numpy.arange(NUM_TILES)[None, :]
+        segment = tile_idx // SEGMENT_LENGTH
+        t = (tile_idx % SEGMENT_LENGTH) / SEGMENT_LENGTH
+        start_angle = player_angle + (2 * numpy.pi / 5) * segment
+        end_angle = player_angle + (2 * numpy.pi / 5) * (segment + 1)
+        angle = start_angle * (1 - t) + end_angle * t
+        radius = self.min_radius + (self.max_radius - self.min_radius) * numpy.abs(t - 0.5) * 2
+        xs = (self.center[0] + radius * numpy.cos(angle)).astype(int).tolist()
+        ys = (self.center[1] + radius * numpy.sin(angle)).astype(int).tolist()
+        return [list(zip(row_x, row_y)) for row_x, row_y in zip(xs, ys)]
+
+    def _build_hit_index(self):
+        # Every shape is added to each grid cell its bounding box touches, so
+        # a lookup only tests the few shapes in the cell under the mouse
+        self.cells = {}
+        for player_id in range(NUM_PLAYERS):
+            for tile_idx, (x, y) in enumerate(self.tiles[player_id]):
+                self._index_shape(("tile", player_id, tile_idx, x, y, self.tile_half_size))
+            for token_idx, (x, y) in enumerate(self.base_slots[player_id]):
+                self._index_shape(("base", player_id, token_idx, x, y, self.token_radius))
+
+    def _index_shape(self, shape):
+        x, y, size = shape[3], shape[4], shape[5]
+        for cell_x in range(int((x - size) // HIT_CELL_SIZE), int((x + size) // HIT_CELL_SIZE) + 1):
+            for cell_y in range(int((y - size) // HIT_CELL_SIZE), int((y + size) // HIT_CELL_SIZE) + 1):
+                self.cells.setdefault((cell_x, cell_y), []).append(shape)
+
+    def hit_test(self, x, y):
+        # Returns ("tile", player_id, tile_idx) and ("base", player_id, token_idx)
+        # for every shape under (x, y). Players' paths overlap on the board, so
+        # one spot can be a tile of several players.
+        hits = []
+        for kind, player_id, index, shape_x, shape_y, size in self.cells.get((x // HIT_CELL_SIZE, y // HIT_CELL_SIZE), ()):
+            if kind == "tile":
+                if abs(x - shape_x) <= size and abs(y - shape_y) <= size:
+                    hits.append((kind, player_id, index))
+            elif (x - shape_x) ** 2 + (y - shape_y) ** 2 <= size * size:
+                hits.append((kind, player_id, index))
+        return hits
+
+    def token_at(self, game, x, y):
+        # (player_id, token_id) of the token drawn at (x, y), or None
+        for kind, player_id, index in self.hit_test(x, y):
+            tokens = game.players[player_id].tokens
+            if kind == "base":
+                if tokens[index].position == -1:
+                    return player_id, index
+            else:
+                for token_id, token in enumerate(tokens):
+                    if token.position == index:
+                        return player_id, token_id
+        return None
@@ -0,0 +1,297 @@
+import math
+import random
+import time
+
+from ludo_engine import (
+    CUR, DICE, DOUBLE_ROLL_TILE, HOME, MOVING, NUM_PLAYERS, NUM_TILES, NUM_TOKENS, POS,
+    POWERUP, POWERUP_PENDING, RING_SQUARE, SAFE_TILE, TURN, WINNER, CompactState,
+)
+
+# UCB1 exploration constant; rewards are 1 for a win and 0 otherwise
+EXPLORATION = 1.0
+# A rollout that has not finished after this many dice rolls counts as a
+# game nobody wins
+MAX_ROLLOUT_ROLLS = 2000
+
+class MCTSNode:
+    # A position in the search tree. A decision node (moves is a list) is a
+    # player to move with the dice already rolled, a chance node (moves is
+    # None) a player about to roll; its children are indexed by dice - 1.
+    # wins counts the rollouts through this node won by `player`, the player
+    # whose move led here, which is what that player's UCB1 choice compares.
+    # key is the Zobrist hash of the position, used to find it again when
+    # the tree is reused on a later turn.
+    __slots__ = ("key", "player", "moves", "children", "visits", "wins", "winner")
+
+    def __init__(self, state, player):
+        data = state.data
+        self.key = state.hash
+        self.player = player
+        self.winner = data[WINNER]
+        if self.winner >= 0:
+            self.moves = ()
+            self.children = ()
+        elif data[TURN] == MOVING:
+            self.moves = state.get_available_moves()
+            self.children = [None] * len(self.moves)
+        else:
+            self.moves = None
+            self.children = [None] * 6
+        self.visits = 0
+        self.wins = 0
+
+    def find(self, key):
+        # The decision node for the position with this hash, searching
+        # breadth first so the shallowest copy of a transposition is used
+        queue = [self]
+        for node in queue:
+            if node.key == key and node.moves:
+                return node
+            queue.extend(child for child in node.children if child is not None)
+        return None
+
+def resolve_powerup(state):
+    # A pending power-up has only one action, so the tree never stops on it
+    if state.data[TURN] == POWERUP_PENDING:
+        state.use_powerup()
+
+def rollout(data, tiles, rng=random, max_rolls=MAX_ROLLOUT_ROLLS):
+    # Plays the game in data (CompactState.data) to the end and returns the
+    # winner, or -1 if it did not finish. Works on plain lists and ints
+    # rather than CompactState so no undo records or move lists are built.
+    # Each roll moves a token home if it can, else captures, else brings a
+    # token out of base, else moves a random token.
+    winner = data[WINNER]
+    if winner >= 0:
+        return winner
+    positions = list(data[POS:HOME])
+    home = list(data[HOME:HOME + NUM_PLAYERS])
+    player_id = data[CUR]
+    turn = data[TURN]
+    dice = data[DICE]
+    occupancy = [0] * NUM_PLAYERS
+    for index in range(NUM_PLAYERS * NUM_TOKENS):
+        position = positions[index]
+        if 0 <= position < 40:
+            owner = index // NUM_TOKENS
+            occupancy[owner] |= 1 << RING_SQUARE[owner][position]
+    randrange = rng.randrange
+    if turn == POWERUP_PENDING:
+        if data[POWERUP] == DOUBLE_ROLL_TILE:
+            turn = 0
+        else:
+            player_id = (player_id + 1) % NUM_PLAYERS
+            turn = 0
+    for _ in range(max_rolls):
+        if turn == MOVING:
+            # The dice of the position we started from
+            turn = 0
+        else:
+            dice = randrange(6) + 1
+        base = player_id * NUM_TOKENS
+        ring = RING_SQUARE[player_id]
+        others = 0
+        for opponent_id in range(NUM_PLAYERS):
+            if opponent_id != player_id:
+                others |= occupancy[opponent_id]
+        best_token = -1
+        best_priority = 0
+        for token_id in range(NUM_TOKENS):
+            position = positions[base + token_id]
+            if position == -1:
+                priority = 3 if dice == 6 else 0
+            elif position >= 40:
+                priority = 0
+            elif position + dice >= 39:
+                priority = 5
+            elif others >> ring[position + dice] & 1 and tiles[player_id * NUM_TILES + position + dice] != SAFE_TILE:
+                priority = 4
+            else:
+                priority = 1 + randrange(2)
+            if priority > best_priority:
+                best_priority = priority
+                best_token = token_id
+        if best_token < 0:
+            player_id = (player_id + 1) % NUM_PLAYERS
+            continue
+        index = base + best_token
+        position = positions[index]
+        extra_roll = False
+        if position == -1:
+            positions[index] = 0
+        elif position + dice >= 39:
+            positions[index] = 40
+            home[player_id] += 1
+            if home[player_id] >= 2:
+                return player_id
+        else:
+            new_pos = position + dice
+            positions[index] = new_pos
+            tile = tiles[player_id * NUM_TILES + new_pos]
+            if tile != SAFE_TILE:
+                square = ring[new_pos]
+                if others >> square & 1:
+                    for opponent_id in range(NUM_PLAYERS):
+                        if occupancy[opponent_id] >> square & 1 and opponent_id != player_id:
+                            opponent_ring = RING_SQUARE[opponent_id]
+                            for other in range(opponent_id * NUM_TOKENS, (opponent_id + 1) * NUM_TOKENS):
+                                if 0 <= positions[other] < 40 and opponent_ring[positions[other]] == square:
+                                    positions[other] = -1
+                            occupancy[opponent_id] &= ~(1 << square)
+            extra_roll = tile == DOUBLE_ROLL_TILE
+        mask = 0
+        for token_index in range(base, base + NUM_TOKENS):
+            if 0 <= positions[token_index] < 40:
+                mask |= 1 << ring[positions[token_index]]
+        occupancy[player_id] = mask
+        if not extra_roll:
+            player_id = (player_id + 1) % NUM_PLAYERS
+    return -1
+
+class MCTSPlayer:
+    # UCT over a tree of decision and chance nodes, with the same get_move
+    # interface as AIPlayer. Each iteration walks the tree from the root
+    # (UCB1 at decision nodes, a random roll at chance nodes), adds one node
+    # and finishes the game with a rollout. Every player maximizes their
+    # own win count. The move played is the most visited one.
+    # The tree is kept between turns: if the position of the next get_move
+    # is in it, the search continues from that subtree.
+    search = "mcts"
+
+    def __init__(self, player_id, iterations=1000, time_budget_ms=None, exploration=EXPLORATION,
+                 pool=None, stats_log=None, seed=None):
+        self.player_id = player_id
+        self.iterations = iterations
+        # With a time budget the search runs until the budget is used up
+        # rather than for a fixed number of iterations
+        self.time_budget_ms = time_budget_ms
+        self.exploration = exploration
+        # A ludo_parallel.SearchPool for root-parallel search: every worker
+        # grows its own tree and the root statistics are added up
+        self.pool = pool
+        self.stats_log = stats_log
+        self.rng = random.Random(seed)
+        self.root = None
+        self._tiles = None
+        self.nodes = 0
+        self.rollouts = 0
+        self.stats = {}
+        self.cancelled = False
+
+    def get_move(self, game, budget_ms=None):
+        return self.choose_move(CompactState.from_game(game), game.available_moves, budget_ms)
+
+    def choose_move(self, state, moves, budget_ms=None):
+        self.cancelled = False
+        if budget_ms is None:
+            budget_ms = self.time_budget_ms
+        start = time.perf_counter()
+        if not moves:
+            return None
+        if self.pool is not None:
+            visits, wins = self.pool.mcts_root_stats(self, state, budget_ms)
+            moves = state.get_available_moves()
+            reused = 0
+        else:
+            root, reused, _ = self.search_tree(state, budget_ms)
+            visits = [child.visits if child is not None else 0 for child in root.children]
+            wins = [child.wins if child is not None else 0 for child in root.children]
+            moves = root.moves
+        best = max(range(len(moves)), key=visits.__getitem__)
+        self._record_stats(start, moves[best], wins[best] / visits[best] if visits[best] else None, reused)
+        return moves[best]
+
+    def search_tree(self, state, budget_ms=None):
+        # Runs the search from state and returns (root, reused, before):
+        # reused is the visits the root already had from earlier turns and
+        # before the (visits, wins) of each root move at that point
+        self.nodes = 0
+        self.rollouts = 0
+        root = None
+        if self.root is not None and state.tiles == self._tiles:
+            root = self.root.find(state.hash)
+        if root is None:
+            root = MCTSNode(state, -1)
+        reused = root.visits
+        before = [(child.visits, child.wins) if child is not None else (0, 0) for child in root.children]
+        self.root = root
+        self._tiles = state.tiles
+        deadline = math.inf if budget_ms is None else time.perf_counter() + budget_ms / 1000
+        iterations = math.inf if budget_ms is not None else self.iterations
+        done = 0
+        while done < iterations and not self.cancelled:
+            self.iterate(root, state)
+            done += 1
+            if time.perf_counter() >= deadline:
+                break
+        return root, reused, before
+
+    def iterate(self, root, root_state):
+        state = root_state.copy()
+        node = root
+        path = [root]
+        rng = self.rng
+        exploration = self.exploration
+        while True:
+            if node.winner >= 0:
+                winner = node.winner
+                break
+            children = node.children
+            if node.moves is None:
+                dice = rng.randrange(6) + 1
+                state.roll(dice)
+                child = children[dice - 1]
+                if child is None:
+                    child = children[dice - 1] = MCTSNode(state, -1)
+                    self.nodes += 1
+                    path.append(child)
+                    winner = rollout(state.data, state.tiles, rng)
+                    break
+            else:
+                player_id = state.data[CUR]
+                index = -1
+                for move_index in range(len(children)):
+                    if children[move_index] is None:
+                        index = move_index
+                        break
+                expand = index >= 0
+                if not expand:
+                    log_visits = math.log(node.visits)
+                    best_score = -math.inf
+                    for move_index, child in enumerate(children):
+                        score = child.wins / child.visits + exploration * math.sqrt(log_visits / child.visits)
+                        if score > best_score:
+                            best_score = score
+                            index = move_index
+                state.make_move(*node.moves[index])
+                resolve_powerup(state)
+                if expand:
+                    child = children[index] = MCTSNode(state, player_id)
+                    self.nodes += 1
+                    path.append(child)
+                    winner = rollout(state.data, state.tiles, rng)
+                    break
+                child = children[index]
+            node = child
+            path.append(node)
+        self.rollouts += 1
+        for node in path:
+            node.visits += 1
+            if node.player == winner:
+                node.wins += 1
+
+    def _record_stats(self, start, move, value, reused):
+        # Same keys as AIPlayer.stats where they apply: nodes are the tree
+        # nodes added, evaluations the rollouts played
+        elapsed = time.perf_counter() - start
+        self.stats = {"player": self.player_id, "search": self.search, "depth": 0, "nodes": self.nodes,
+                      "cutoffs": 0, "evaluations": self.rollouts, "value": value, "move": move,
+                      "elapsed_ms": 1000 * elapsed, "timed_out": False, "iterations": [],
+                      "rollouts_per_sec": self.rollouts / elapsed if elapsed > 0 else 0.0,
+                      "reused_visits": reused}
+        if self.stats_log is not None:
+            self.stats_log.record("search", self.stats)
+
+    def cancel(self):
+        # Stops a search running on another thread after the current iteration
+        self.cancelled = True
@@ -0,0 +1,198 @@
+import math
+import multiprocessing
+import pickle
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from ludo_engine import (
+    DICE_FACES, POWERUP_PENDING, ROLLING, TIE_MARGIN, TURN, WINNER, AIPlayer, CompactState, SearchTimeout,
+)
+from ludo_mcts import MCTSPlayer
+
+# Worker process state: the shared alpha and one AIPlayer per configuration,
+# so transposition tables persist between tasks
+_shared_alpha = None
+_worker_ais = {}
+_worker_mcts = {}
+
+def _init_worker(shared_alpha):
+    global _shared_alpha
+    _shared_alpha = shared_alpha
+
+def _worker_ai(player_id, search, tt_size, evaluator):
+    # evaluator is the pickled Evaluator, which also tells configurations apart
+    key = (player_id, search, tt_size, evaluator)
+    if key not in _worker_ais:
+        _worker_ais[key] = AIPlayer(player_id, search=search, tt_size=tt_size, evaluator=pickle.loads(evaluator))
+    return _worker_ais[key]
+
+def _search_task(task):
+    # Scores one root move, or one dice outcome of the chance node right after
+    # it. Returns (value, failed_low, (nodes, cutoffs, evaluations)); a
+    # failed-low value is only an upper bound and means the root move cannot
+    # be the best one. value is None if the search ran past deadline, a
+    # time.time() value.
+    data, tiles, player_id, search, tt_size, evaluator, depth, roll, bound_upper, deadline = task
+    state = CompactState(array("b", data), tiles)
+    ai = _worker_ai(player_id, search, tt_size, evaluator)
+    ai.begin_search(state)
+    if deadline is not None:
+        ai.deadline = time.perf_counter() + deadline - time.time()
+    try:
+        return _search_value(ai, state, search, depth, roll, bound_upper)
+    except SearchTimeout:
+        return None, False, _counters(ai)
+    finally:
+        ai.deadline = None
+
+def _search_value(ai, state, search, depth, roll, bound_upper):
+    alpha = _shared_alpha.value - TIE_MARGIN if search != "expectimax" else -math.inf
+    if search == "minimax":
+        value = ai.minimax(state, depth, alpha, math.inf, False)
+        return value, value <= alpha, _counters(ai)
+    if roll:
+        # Star1 window for one outcome, assuming the other five are as good
+        # as they can possibly be
+        window_alpha = DICE_FACES * alpha - (DICE_FACES - 1) * bound_upper
+        state.roll(roll)
+        value = ai.roll_child(state, depth, window_alpha, math.inf)
+        return value, value <= window_alpha, _counters(ai)
+    value = ai.expectimax(state, depth, alpha, math.inf)
+    return value, value <= alpha, _counters(ai)
+
+def _mcts_task(task):
+    # Grows this worker's tree for the position and returns the visits and
+    # wins each root move gained, with the nodes added and rollouts played.
+    # The worker keeps its tree for later tasks, so only what this task added
+    # is reported: a worker can get two tasks for the same position.
+    data, tiles, player_id, iterations, budget_ms, exploration, seed = task
+    state = CompactState(array("b", data), tiles)
+    key = (player_id, exploration)
+    if key not in _worker_mcts:
+        _worker_mcts[key] = MCTSPlayer(player_id, exploration=exploration)
+    player = _worker_mcts[key]
+    player.iterations = iterations
+    player.rng.seed(seed)
+    root, _, before = player.search_tree(state, budget_ms)
+    visits = [(child.visits if child is not None else 0) - old for child, (old, _) in zip(root.children, before)]
+    wins = [(child.wins if child is not None else 0) - old for child, (_, old) in zip(root.children, before)]
+    return visits, wins, player.nodes, player.rollouts
+
+def _counters(ai):
+    return ai.nodes, ai.cutoffs, ai.evaluations
+
+class SearchPool:
+    # A persistent process pool that AIPlayer(pool=...) uses to score root
+    # moves, or root move x dice outcome pairs, in parallel. Workers receive
+    # the position as CompactState bytes. The best value found so far is
+    # shared with them so later tasks can still prune.
+    def __init__(self, workers):
+        context = multiprocessing.get_context()
+        self.workers = workers
+        self.alpha = context.Value("d", -math.inf)
+        self.executor = ProcessPoolExecutor(workers, mp_context=context,
+                                            initializer=_init_worker, initargs=(self.alpha,))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def mcts_root_stats(self, player, state, budget_ms):
+        # Root-parallel MCTS: every worker searches the position with its own
+        # tree and a seed of its own. Returns the visits and wins of each root
+        # move, in state.get_available_moves() order, summed over the workers.
+        data = state.data.tobytes()
+        tasks = [(data, state.tiles, player.player_id, player.iterations, budget_ms, player.exploration,
+                  player.rng.getrandbits(63)) for _ in range(self.workers)]
+        player.nodes = 0
+        player.rollouts = 0
+        visits = None
+        for task_visits, task_wins, nodes, rollouts in self.executor.map(_mcts_task, tasks):
+            player.nodes += nodes
+            player.rollouts += rollouts
+            if visits is None:
+                visits, wins = task_visits, task_wins
+            else:
+                visits = [a + b for a, b in zip(visits, task_visits)]
+                wins = [a + b for a, b in zip(wins, task_wins)]
+        return visits, wins
+
+    def _tasks(self, ai, state, depth, evaluator, deadline):
+        # Same steps as AIPlayer.expectimax up to the first chance node, which
+        # is split into one task per dice outcome
+        data = state.data
+        if ai.search != "minimax" and depth > 0 and data[WINNER] < 0:
+            state = state.copy()
+            if data[TURN] == POWERUP_PENDING:
+                state.use_powerup()
+            if state.data[TURN] == ROLLING:
+                bound_upper = ai.value_bounds(state, depth)[1]
+                return [(state.data.tobytes(), state.tiles, ai.player_id, ai.search, ai.tt_size, evaluator,
+                         depth, roll, bound_upper, deadline) for roll in range(1, DICE_FACES + 1)]
+        return [(state.data.tobytes(), state.tiles, ai.player_id, ai.search, ai.tt_size, evaluator,
+                 depth, 0, 0, deadline)]
+
+    def search_root(self, ai, state, moves, depth, deadline=None):
+        # Returns (best move, value) like AIPlayer.search_root, which
+        # ai.begin_search has been called for. Raises SearchTimeout once
+        # deadline (a time.time() value) passes or ai is cancelled; the
+        # workers stop their own searches at the deadline.
+        evaluator = pickle.dumps(ai.evaluator)
+        self.alpha.value = -math.inf
+        ai._root_best = None
+        pending = {}
+        root = []
+        for move in moves:
+            undo = state.make_move(move[0], move[1])
+            if undo is None:
+                continue
+            futures = [self.executor.submit(_search_task, task)
+                       for task in self._tasks(ai, state, depth - 1, evaluator, deadline)]
+            state.unmake_move(undo)
+            entry = [move, futures, None]
+            root.append(entry)
+            for future in futures:
+                pending[future] = entry
+        while pending:
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done or ai.cancelled or any(future.result()[0] is None for future in done):
+                for future in pending:
+                    future.cancel()
+                raise SearchTimeout
+            for future in done:
+                entry = pending.pop(future)
+                nodes, cutoffs, evaluations = future.result()[2]
+                ai.nodes += nodes
+                ai.cutoffs += cutoffs
+                ai.evaluations += evaluations
+                if entry[2] is not None or not all(f.done() for f in entry[1]):
+                    if entry[2] is None and future.result()[1]:
+                        # One outcome already rules this root move out
+                        entry[2] = -math.inf
+                        for other in entry[1]:
+                            if other.cancel():
+                                del pending[other]
+                    continue
+                results = [f.result() for f in entry[1]]
+                if any(failed_low for _, failed_low, _ in results):
+                    entry[2] = -math.inf
+                    continue
+                values = [value for value, _, _ in results]
+                entry[2] = values[0] if len(values) == 1 else sum(values) / DICE_FACES
+                if entry[2] > self.alpha.value:
+                    self.alpha.value = entry[2]
+                    ai._root_best = entry[0]
+        best_move = None
+        best_value = -math.inf
+        for move, _, value in root:
+            if value > best_value:
+                best_value = value
+                best_move = move
+        return best_move, best_value
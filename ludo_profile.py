@@ -0,0 +1,48 @@
+import json
+import threading
+import time
+from collections import deque
+
+class StatsLog:
+    # Writes one JSON object per line: {"type": kind, "time": unix time, ...}.
+    # AIPlayer(stats_log=...) writes a "search" record after every move and
+    # ludo.py a "frame" record per frame. Records can come from the AI thread
+    # and the render thread at once, so writes are serialized.
+    def __init__(self, path):
+        self.file = open(path, "a")
+        self.lock = threading.Lock()
+
+    def record(self, kind, fields):
+        line = json.dumps({"type": kind, "time": round(time.time(), 3), **fields})
+        with self.lock:
+            self.file.write(line + "\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class RollingAverages:
+    # Mean of the last `window` values added under each name
+    def __init__(self, window=60):
+        self.window = window
+        self.values = {}
+
+    def add(self, name, value):
+        values = self.values.get(name)
+        if values is None:
+            values = self.values[name] = deque(maxlen=self.window)
+        values.append(value)
+
+    def mean(self, name):
+        values = self.values.get(name)
+        return sum(values) / len(values) if values else 0.0
+
+    def count(self, name):
+        values = self.values.get(name)
+        return len(values) if values else 0
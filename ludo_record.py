@@ -0,0 +1,265 @@
+import json
+import mmap
+import os
+import struct
+from array import array
+
+from ludo_engine import NUM_PLAYERS, NUM_TILES, TILE_TYPES, LudoGame
+
+# Archive layout (little-endian):
+#   FILE_MAGIC, then one block per game:
+#   game header   GAME_HEADER: b"GAME", seed (-1 if unknown), turn count,
+#                 config length, then the tile layout (TILE_TYPES index of
+#                 every player's path tile, player * NUM_TILES + tile)
+#   config        JSON list with one entry per seat describing who played it
+#   turns         turn count fixed-width TURN_RECORDs
+# A turn is one dice roll and what came of it: the player, the dice, the
+# token moved (-1 if the roll had no legal move), the move type and the
+# power-up the move landed on (TILE_TYPES index, 0 for none). The turn count
+# is written when the game ends; a game cut off by a crash keeps
+# UNFINISHED and is read up to the end of the file, until a writer opens
+# the archive again and finishes it at its last whole turn.
+#
+# The index file (archive path + INDEX_SUFFIX) holds the byte offset of
+# every finished game as a uint64, so opening an archive does not have to
+# walk the game headers. Games after the last one it lists are found by
+# walking from there.
+FILE_MAGIC = b"LUDOREC1"
+GAME_MAGIC = b"GAME"
+GAME_HEADER = struct.Struct("<4sqII%ds" % (NUM_PLAYERS * NUM_TILES))
+TURN_RECORD = struct.Struct("<BBbBB")
+UNFINISHED = 0xFFFFFFFF
+MOVE_TYPES = [None, "start", "move", "home"]
+INDEX_SUFFIX = ".idx"
+
+def game_end(buffer, offset):
+    # Where the finished game at offset ends
+    _, _, turns, config_length, _ = GAME_HEADER.unpack_from(buffer, offset)
+    return offset + GAME_HEADER.size + config_length + turns * TURN_RECORD.size
+
+def read_index(path, buffer):
+    # (offsets of the finished games, offset just past the last of them).
+    # Index entries that do not point at a game in buffer, e.g. after the
+    # archive was cut short, are dropped.
+    offsets = array("Q")
+    if os.path.exists(path + INDEX_SUFFIX):
+        with open(path + INDEX_SUFFIX, "rb") as f:
+            data = f.read()
+        offsets.frombytes(data[:len(data) - len(data) % offsets.itemsize])
+    size = len(buffer)
+    while offsets and not (offsets[-1] + GAME_HEADER.size <= size
+                           and buffer[offsets[-1]:offsets[-1] + len(GAME_MAGIC)] == GAME_MAGIC
+                           and game_end(buffer, offsets[-1]) <= size):
+        offsets.pop()
+    tail = game_end(buffer, offsets[-1]) if offsets else len(FILE_MAGIC)
+    while tail + GAME_HEADER.size <= size:
+        magic, _, turns, _, _ = GAME_HEADER.unpack_from(buffer, tail)
+        if magic != GAME_MAGIC:
+            raise ValueError(f"corrupt game header at byte {tail}")
+        if turns == UNFINISHED or game_end(buffer, tail) > size:
+            break
+        offsets.append(tail)
+        tail = game_end(buffer, tail)
+    return offsets, tail
+
+def player_config(player):
+    # What to store in the header for a seat: an AIPlayer's or MCTSPlayer's
+    # settings, or a human for None
+    if player is None:
+        return {"type": "human"}
+    if player.search == "mcts":
+        return {"type": "ai", "search": "mcts", "iterations": player.iterations,
+                "time_budget_ms": player.time_budget_ms, "exploration": player.exploration}
+    return {"type": "ai", "depth": player.depth, "search": player.search, "tt_size": player.tt_size,
+            "time_budget_ms": player.time_budget_ms, "evaluator": type(player.evaluator).__name__}
+
+class GameRecordWriter:
+    # Streams games into an archive. attach() hooks it into a LudoGame, after
+    # which the game reports every turn to record_turn and every reset_game
+    # starts a new game record. Appends to an existing archive.
+    def __init__(self, path):
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, "r+b" if exists else "w+b")
+        offsets = array("Q")
+        if exists:
+            if self.file.read(len(FILE_MAGIC)) != FILE_MAGIC:
+                self.file.close()
+                raise ValueError(f"{path} is not a game record archive")
+            offsets = self._repair(path)
+            self.file.seek(0, os.SEEK_END)
+        else:
+            self.file.write(FILE_MAGIC)
+        # Rewritten whole, so it matches the archive even if it was stale
+        self.index = open(path + INDEX_SUFFIX, "wb")
+        offsets.tofile(self.index)
+        self.players = None
+        self.seed = None
+        self.game_offset = None
+        self.turns = 0
+
+    def _repair(self, path):
+        # Finishes a game cut off by a crash at its last whole turn, or drops
+        # it if not even its header was written. Returns the offsets of the
+        # finished games.
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            offsets, tail = read_index(path, buffer)
+            size = len(buffer)
+            end = tail
+            if tail + GAME_HEADER.size <= size:
+                _, _, _, config_length, _ = GAME_HEADER.unpack_from(buffer, tail)
+                turns_offset = tail + GAME_HEADER.size + config_length
+                turns = (size - turns_offset) // TURN_RECORD.size if turns_offset <= size else 0
+                if turns:
+                    end = turns_offset + turns * TURN_RECORD.size
+        if end > tail:
+            self.file.seek(tail + 12)
+            self.file.write(struct.pack("<I", turns))
+            offsets.append(tail)
+        self.file.truncate(end)
+        return offsets
+
+    def attach(self, game, players=None, seed=None):
+        # players: the config of each seat (see player_config), kept for every
+        # later game until attach is called again. seed: the random seed the
+        # game was started from, if any; it only applies to this game.
+        self.players = players
+        self.seed = seed
+        game.recorder = self
+        self.begin_game(game)
+
+    def begin_game(self, game):
+        self.end_game()
+        config = json.dumps(self.players or []).encode()
+        tiles = bytes(TILE_TYPES.index(tile["type"]) for path in game.board for tile in path)
+        self.game_offset = self.file.tell()
+        self.turns = 0
+        self.file.write(GAME_HEADER.pack(GAME_MAGIC, -1 if self.seed is None else self.seed,
+                                         UNFINISHED, len(config), tiles))
+        self.file.write(config)
+        self.seed = None
+
+    def record_turn(self, player_id, dice, token_id, move_type, powerup):
+        self.file.write(TURN_RECORD.pack(player_id, dice, token_id, MOVE_TYPES.index(move_type),
+                                         TILE_TYPES.index(powerup) if powerup else 0))
+        self.turns += 1
+
+    def end_game(self):
+        # Writes the turn count of the game in progress; games that were
+        # started but never played are dropped
+        if self.game_offset is None:
+            return
+        if self.turns:
+            self.file.seek(self.game_offset + 12)
+            self.file.write(struct.pack("<I", self.turns))
+            self.file.seek(0, os.SEEK_END)
+            self.index.write(struct.pack("<Q", self.game_offset))
+        else:
+            self.file.seek(self.game_offset)
+            self.file.truncate()
+        self.game_offset = None
+
+    def close(self):
+        self.end_game()
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class GameRecord:
+    # One game in a GameArchive. Turns are decoded on demand from the mapped
+    # file, so any turn can be read without touching the others.
+    def __init__(self, buffer, offset, end):
+        _, seed, turns, config_length, tiles = GAME_HEADER.unpack_from(buffer, offset)
+        self.offset = offset
+        self.seed = None if seed < 0 else seed
+        self.tiles = tiles
+        config_start = offset + GAME_HEADER.size
+        self.players = json.loads(bytes(buffer[config_start:config_start + config_length]))
+        self.turns_offset = config_start + config_length
+        # An unfinished game, or one cut short, is read up to the last whole
+        # turn before end
+        turns = min(turns, (end - self.turns_offset) // TURN_RECORD.size)
+        self.end = self.turns_offset + turns * TURN_RECORD.size
+        self.buffer = buffer
+
+    def __len__(self):
+        return (self.end - self.turns_offset) // TURN_RECORD.size
+
+    def turn(self, index):
+        # (player_id, dice, token_id, move_type, powerup) of a turn; token_id
+        # is -1 and move_type None for a roll without a legal move
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        player_id, dice, token_id, move_type, powerup = TURN_RECORD.unpack_from(
+            self.buffer, self.turns_offset + index * TURN_RECORD.size)
+        return player_id, dice, token_id, MOVE_TYPES[move_type], TILE_TYPES[powerup] if powerup else None
+
+    def turns(self):
+        for index in range(len(self)):
+            yield self.turn(index)
+
+    def new_game(self):
+        # A LudoGame with this record's tile layout, before the first turn
+        game = LudoGame()
+        for player_id, path in enumerate(game.board):
+            for tile_idx, tile in enumerate(path):
+                tile["type"] = TILE_TYPES[self.tiles[player_id * NUM_TILES + tile_idx]]
+        return game
+
+    def replay(self, game, index):
+        # Plays turn `index` on a game that has played the turns before it
+        player_id, dice, token_id, move_type, _ = self.turn(index)
+        if game.current_player != player_id or not game.roll_dice(dice):
+            raise ValueError(f"turn {index} does not fit the game")
+        if move_type is not None:
+            if not game.make_move(player_id, token_id, move_type):
+                raise ValueError(f"turn {index} does not fit the game")
+            if game.turn_state == "powerup":
+                game.use_powerup(player_id)
+
+    def game_at(self, index):
+        # The game as it was after `index` turns
+        game = self.new_game()
+        for turn in range(index):
+            self.replay(game, turn)
+        return game
+
+class GameArchive:
+    # Reads an archive through mmap. Where each game starts comes from the
+    # index file; turns are read when asked for.
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(FILE_MAGIC)] != FILE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a game record archive")
+        self.offsets, tail = read_index(path, self.buffer)
+        # A game still being written, or cut off by a crash
+        if tail + GAME_HEADER.size <= len(self.buffer):
+            config_length = GAME_HEADER.unpack_from(self.buffer, tail)[3]
+            if tail + GAME_HEADER.size + config_length <= len(self.buffer):
+                self.offsets.append(tail)
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def game(self, index):
+        return GameRecord(self.buffer, self.offsets[index], len(self.buffer))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self.game(index)
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
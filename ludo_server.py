@@ -0,0 +1,415 @@
+import argparse
+import asyncio
+import collections
+import json
+import os
+import random
+import signal
+import sys
+import threading
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from ludo_engine import NUM_PLAYERS, CompactState, LudoGame
+from tournament import make_player, parse_config
+
+# Protocol: one JSON object per line each way. Requests carry an "op":
+#   create  {"seats": [...]}          one entry per seat, "human" or an AI
+#                                     setting as in tournament.py; the client
+#                                     takes the human seats and watches
+#   join    {"table": id, "seat": n}  take a free human seat and watch
+#   watch   {"table": id}             receive the table's updates
+#   leave   {"table": id}             stop watching and give up its seats
+#   roll    {"table": id}             roll for your seat
+#   move    {"table": id, "token": t, "move_type": m}
+#   snapshot {"table": id}            the whole table again
+#   info                              server load
+# Watchers get one "snapshot" of the table, then a "delta" holding only the
+# fields that changed each time the table moves on. Every update carries the
+# table's version, which goes up by one per delta.
+DEFAULT_PORT = 8765
+# AI moves handed to the pool per worker process. The rest wait in the
+# server, so a table that needs a move late does not queue behind a backlog
+# that is already in the pool's own queue.
+INFLIGHT_PER_WORKER = 2
+# New tables are refused while this many tables are waiting for an AI move
+MAX_WAITING = 1000
+# Messages queued for a client before the server stops reading its requests,
+# or for deltas, drops them and sends fresh snapshots instead
+SEND_QUEUE = 256
+# Limits on the AI settings clients may ask for. On top of them every AI
+# move is cut off after the server's time budget, so no table can hold a
+# worker for long whatever it asks for.
+MAX_AI_DEPTH = 4
+MAX_AI_ITERATIONS = 10000
+AI_BUDGET_MS = 200
+
+# Worker process state: one player per AI setting and seat, so searches keep
+# their tables and trees between moves
+_worker_players = {}
+
+def _ai_move(task):
+    # The search keeps its own depth or iterations; the budget only cancels
+    # it, and the best root move found by then is played
+    setting, player_id, data, tiles, moves, budget_ms = task
+    key = (setting, player_id)
+    player = _worker_players.get(key)
+    if player is None:
+        player = _worker_players[key] = make_player(parse_config(setting), player_id, None)
+    timer = threading.Timer(budget_ms / 1000, player.cancel)
+    timer.start()
+    try:
+        move = player.choose_move(CompactState(array("b", data), tiles), moves)
+    finally:
+        timer.cancel()
+    return move if move is not None else moves[0]
+
+def seat_config(seat):
+    # None for a human seat, else the AI setting, within the server's limits
+    if seat == "human":
+        return None
+    config = parse_config(seat)
+    if config.get("depth", 0) > MAX_AI_DEPTH:
+        raise ValueError(f"depth is at most {MAX_AI_DEPTH} in {seat!r}")
+    if config.get("iterations", 0) > MAX_AI_ITERATIONS:
+        raise ValueError(f"iterations are at most {MAX_AI_ITERATIONS} in {seat!r}")
+    return config
+
+def encode(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+def game_view(game, rolls, last_roll):
+    # rolls counts the dice rolls so far, so a roll that leaves the table
+    # as it was still makes a delta
+    return {"current_player": game.current_player, "dice": game.dice_roll, "turn_state": game.turn_state,
+            "moves": [list(move) for move in game.available_moves], "winner": game.winner,
+            "rolls": rolls, "last_roll": last_roll, "home": [player.tokens_home for player in game.players],
+            "tokens": [token.position for player in game.players for token in player.tokens]}
+
+def view_delta(old, new):
+    # Fields of new that differ from old; tokens as [index, position] pairs
+    changes = {}
+    for key, value in new.items():
+        if key == "tokens":
+            moved = [[index, position] for index, (before, position) in enumerate(zip(old[key], value))
+                     if before != position]
+            if moved:
+                changes[key] = moved
+        elif value != old[key]:
+            changes[key] = value
+    return changes
+
+class Table:
+    def __init__(self, table_id, seats):
+        self.id = table_id
+        # Per seat, "human" or the AI setting string
+        self.seats = seats
+        self.configs = [seat_config(seat) for seat in seats]
+        # The connection playing each human seat
+        self.players = [None] * NUM_PLAYERS
+        self.watchers = set()
+        self.game = LudoGame()
+        self.tiles = CompactState.from_game(self.game).tiles
+        self.rolls = 0
+        self.last_roll = None
+        self.version = 0
+        self.view = game_view(self.game, 0, None)
+        # True while the table is waiting for, or getting, an AI move
+        self.thinking = False
+        self.closed = False
+
+    def snapshot(self):
+        message = {"type": "snapshot", "table": self.id, "version": self.version, "seats": self.seats,
+                   "tiles": "".join(str(tile) for tile in self.tiles)}
+        message.update(self.view)
+        return message
+
+    def roll(self):
+        # Rolled here rather than by roll_dice, which resets the dice when
+        # there is no move to make
+        dice = random.randint(1, 6)
+        self.rolls += 1
+        self.last_roll = [self.game.current_player, dice]
+        self.game.roll_dice(dice)
+
+    def update(self):
+        # The delta since the last update, or None if nothing changed
+        view = game_view(self.game, self.rolls, self.last_roll)
+        changes = view_delta(self.view, view)
+        if not changes:
+            return None
+        self.view = view
+        self.version += 1
+        return {"type": "delta", "table": self.id, "version": self.version, "changes": changes}
+
+class Connection:
+    def __init__(self, writer):
+        self.writer = writer
+        # (line, is_delta) pairs not yet written
+        self.queue = collections.deque()
+        self.pending = asyncio.Event()
+        self.writable = asyncio.Event()
+        self.writable.set()
+        self.tables = set()
+        self.closed = False
+        self.task = asyncio.create_task(self.write_loop())
+
+    def send(self, message):
+        self.push(encode(message))
+
+    def push(self, line, delta=False):
+        if self.closed:
+            return
+        self.queue.append((line, delta))
+        if len(self.queue) >= SEND_QUEUE:
+            self.writable.clear()
+        self.pending.set()
+
+    def push_delta(self, line):
+        if len(self.queue) < SEND_QUEUE:
+            self.push(line, True)
+            return
+        # The client is not keeping up: replace the deltas it has not been
+        # sent with the current state of its tables. Replies stay queued.
+        self.queue = collections.deque(entry for entry in self.queue if not entry[1])
+        for table in self.tables:
+            self.push(encode(table.snapshot()))
+
+    async def write_loop(self):
+        try:
+            while True:
+                await self.pending.wait()
+                self.pending.clear()
+                while self.queue:
+                    lines = [line for line, _ in self.queue]
+                    self.queue.clear()
+                    self.writer.write(b"".join(lines))
+                    await self.writer.drain()
+                self.writable.set()
+        except ConnectionError:
+            # The client is gone. Closing the writer ends the stream
+            # handle_client reads, which then cleans up after the client.
+            self.closed = True
+            self.queue.clear()
+            self.writable.set()
+            self.writer.close()
+
+class GameServer:
+    def __init__(self, workers=None, max_waiting=MAX_WAITING, ai_budget_ms=AI_BUDGET_MS):
+        self.workers = workers or os.cpu_count()
+        self.ai_budget_ms = ai_budget_ms
+        self.executor = ProcessPoolExecutor(self.workers)
+        self.max_waiting = max_waiting
+        self.tables = {}
+        self.next_table = 0
+        # Tables waiting for an AI move, in the order they asked. A table is
+        # in here at most once and goes to the back after every move, so the
+        # pool is shared round robin between tables however many AI seats
+        # each one has.
+        self.waiting = collections.deque()
+        self.inflight = 0
+        self.limit = INFLIGHT_PER_WORKER * self.workers
+        self.ai_moves = 0
+        # The task serving each connection
+        self.clients = {}
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    async def handle_client(self, reader, writer):
+        connection = Connection(writer)
+        self.clients[connection] = asyncio.current_task()
+        try:
+            while True:
+                await connection.writable.wait()
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    reply = self.handle(connection, request)
+                except (ValueError, KeyError, IndexError, TypeError) as error:
+                    reply = {"type": "error", "error": str(error)}
+                if reply is not None:
+                    if isinstance(request, dict) and "id" in request:
+                        reply["id"] = request["id"]
+                    connection.send(reply)
+        except ConnectionError:
+            pass
+        finally:
+            for table in list(connection.tables):
+                self.leave(connection, table)
+            connection.task.cancel()
+            writer.close()
+            del self.clients[connection]
+
+    def handle(self, connection, request):
+        op = request["op"]
+        if op == "info":
+            return {"type": "info", "workers": self.workers, "tables": len(self.tables),
+                    "waiting": len(self.waiting), "inflight": self.inflight, "ai_moves": self.ai_moves}
+        if op == "create":
+            seats = request["seats"]
+            if len(seats) != NUM_PLAYERS:
+                raise ValueError(f"a table has {NUM_PLAYERS} seats")
+            if len(self.waiting) >= self.max_waiting:
+                return {"type": "error", "error": "busy"}
+            table = Table(self.next_table, [str(seat) for seat in seats])
+            self.next_table += 1
+            self.tables[table.id] = table
+            for seat, config in enumerate(table.configs):
+                if config is None:
+                    table.players[seat] = connection
+            connection.send({"type": "created", "table": table.id})
+            self.watch(connection, table)
+            self.advance(table)
+            return None
+        table = self.tables.get(request["table"])
+        if table is None:
+            raise ValueError(f"no table {request['table']}")
+        if op == "watch":
+            self.watch(connection, table)
+        elif op == "join":
+            seat = int(request["seat"])
+            if not 0 <= seat < NUM_PLAYERS:
+                raise ValueError(f"no seat {seat}")
+            if table.configs[seat] is not None or table.players[seat] not in (None, connection):
+                raise ValueError(f"seat {seat} is not a free human seat")
+            table.players[seat] = connection
+            self.watch(connection, table)
+            self.advance(table)
+        elif op == "leave":
+            self.leave(connection, table)
+        elif op == "snapshot":
+            connection.send(table.snapshot())
+        elif op in ("roll", "move"):
+            game = table.game
+            if game.game_over or table.players[game.current_player] is not connection:
+                raise ValueError("not your turn")
+            if op == "roll":
+                if game.turn_state != "rolling":
+                    raise ValueError("not rolling")
+                table.roll()
+            else:
+                # LudoGame.make_move only checks where the token stands, not
+                # that the dice allow the move
+                move = (int(request["token"]), request["move_type"])
+                if move not in game.available_moves:
+                    raise ValueError("illegal move")
+                game.make_move(game.current_player, *move)
+            self.advance(table)
+        else:
+            raise ValueError(f"unknown op {op!r}")
+        return None
+
+    def watch(self, connection, table):
+        if table not in connection.tables:
+            connection.tables.add(table)
+            table.watchers.add(connection)
+            connection.send(table.snapshot())
+
+    def leave(self, connection, table):
+        connection.tables.discard(table)
+        table.watchers.discard(connection)
+        table.players = [None if player is connection else player for player in table.players]
+        if not table.watchers:
+            table.closed = True
+            self.tables.pop(table.id, None)
+
+    def broadcast(self, table):
+        message = table.update()
+        if message is not None:
+            line = encode(message)
+            for connection in table.watchers:
+                connection.push_delta(line)
+
+    def advance(self, table):
+        # Plays the table on until a human has to act or an AI move is
+        # needed, then tells the watchers what changed
+        game = table.game
+        while not game.game_over and not table.thinking:
+            seat = game.current_player
+            if game.turn_state == "powerup":
+                # Only one thing can be done with a power-up
+                game.use_powerup(seat)
+            elif table.configs[seat] is None:
+                break
+            elif game.turn_state == "rolling":
+                table.roll()
+            else:
+                table.thinking = True
+                self.waiting.append(table)
+                self.dispatch()
+        self.broadcast(table)
+
+    def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self.waiting and self.inflight < self.limit:
+            table = self.waiting.popleft()
+            if table.closed:
+                continue
+            game = table.game
+            state = CompactState.from_game(game)
+            task = (table.seats[game.current_player], game.current_player, state.data.tobytes(), state.tiles,
+                    list(game.available_moves), self.ai_budget_ms)
+            self.inflight += 1
+            future = loop.run_in_executor(self.executor, _ai_move, task)
+            future.add_done_callback(partial(self.ai_done, table))
+
+    def ai_done(self, table, future):
+        self.inflight -= 1
+        table.thinking = False
+        if not table.closed and not future.cancelled():
+            game = table.game
+            error = future.exception()
+            if error is not None:
+                print(f"table {table.id}: AI move failed: {error!r}", file=sys.stderr)
+                move = game.available_moves[0]
+            else:
+                move = future.result()
+            game.make_move(game.current_player, *move)
+            self.ai_moves += 1
+            self.advance(table)
+        self.dispatch()
+
+async def serve(server, args):
+    # Serves until SIGINT or SIGTERM
+    if args.unix:
+        listener = await asyncio.start_unix_server(server.handle_client, args.unix)
+    else:
+        listener = await asyncio.start_server(server.handle_client, args.host, args.port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    address = args.unix or f"{args.host}:{args.port}"
+    print(f"serving on {address} with {server.workers} AI workers", flush=True)
+    async with listener:
+        await stop.wait()
+        # Closing the connections ends their tasks
+        tasks = list(server.clients.values())
+        for connection in server.clients:
+            connection.writer.close()
+        await asyncio.gather(*tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Host many Ludo tables over a local JSON-lines socket")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="listen on this Unix socket path instead of TCP")
+    parser.add_argument("--workers", type=int, default=None, help="AI processes (default: one per core)")
+    parser.add_argument("--max-waiting", type=int, default=MAX_WAITING,
+                        help="refuse new tables while this many wait for an AI move")
+    parser.add_argument("--ai-budget-ms", type=float, default=AI_BUDGET_MS,
+                        help="time after which an AI move is cut off")
+    args = parser.parse_args()
+    server = GameServer(args.workers, args.max_waiting, args.ai_budget_ms)
+    try:
+        asyncio.run(serve(server, args))
+    finally:
+        server.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import argparse
+import random
+import time
+
+_start = time.perf_counter()
+from ludo_engine import EVALUATORS, NUM_PLAYERS, SEARCH_MODES, AIPlayer, LudoGame
+STARTUP_TIME = time.perf_counter() - _start
+
+def play_game(ai_players, max_turns=10000, recorder=None, seed=None):
+    game = LudoGame()
+    if recorder is not None:
+        from ludo_record import player_config
+        recorder.attach(game, [player_config(ai) for ai in ai_players], seed)
+    turns = 0
+    while not game.game_over and turns < max_turns:
+        if game.turn_state == "rolling":
+            game.roll_dice()
+        elif game.turn_state == "moving":
+            move = ai_players[game.current_player].get_move(game)
+            game.make_move(game.current_player, *move)
+        elif game.turn_state == "powerup":
+            game.use_powerup(game.current_player)
+        turns += 1
+    if recorder is not None:
+        recorder.end_game()
+        game.recorder = None
+    return game, turns
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless AI-vs-AI self-play for 5-player Ludo")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--search", choices=SEARCH_MODES + ["mcts"], default="minimax")
+    parser.add_argument("--iterations", type=int, default=1000, help="rollouts per move with --search mcts")
+    parser.add_argument("--evaluator", choices=EVALUATORS, default="score")
+    parser.add_argument("--tt-size", type=int, default=0, help="transposition table buckets per AI (0: off)")
+    parser.add_argument("--budget-ms", type=float, default=None, help="time per AI move; deepens iteratively instead of using --depth")
+    parser.add_argument("--workers", type=int, default=0, help="processes for root-parallel search (0: serial)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-turns", type=int, default=10000)
+    parser.add_argument("--stats-log", help="append per-move AI search stats to this JSON-lines file")
+    parser.add_argument("--endgame", help="endgame table (see ludo_endgame.py) the AIs look positions up in")
+    parser.add_argument("--record", help="append every game to this game record archive (see ludo_record.py)")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    pool = None
+    if args.workers:
+        from ludo_parallel import SearchPool
+        pool = SearchPool(args.workers)
+    endgame = None
+    if args.endgame:
+        from ludo_endgame import EndgameTable
+        endgame = EndgameTable(args.endgame)
+    stats_log = None
+    if args.stats_log:
+        from ludo_profile import StatsLog
+        stats_log = StatsLog(args.stats_log)
+    if args.search == "mcts":
+        from ludo_mcts import MCTSPlayer
+        ai_players = [MCTSPlayer(i, args.iterations, args.budget_ms, pool=pool, stats_log=stats_log,
+                                 seed=random.getrandbits(63))
+                      for i in range(NUM_PLAYERS)]
+    else:
+        ai_players = [AIPlayer(i, depth=args.depth, search=args.search, tt_size=args.tt_size, pool=pool,
+                               time_budget_ms=args.budget_ms, stats_log=stats_log, evaluator=EVALUATORS[args.evaluator](),
+                               endgame=endgame)
+                      for i in range(NUM_PLAYERS)]
+    recorder = None
+    if args.record:
+        from ludo_record import GameRecordWriter
+        recorder = GameRecordWriter(args.record)
+    wins = [0] * NUM_PLAYERS
+    unfinished = 0
+    total_turns = 0
+    start = time.perf_counter()
+    for _ in range(args.games):
+        seed = None
+        if recorder is not None:
+            # Each recorded game starts from its own seed, which goes into
+            # its header
+            seed = random.getrandbits(63)
+            random.seed(seed)
+        game, turns = play_game(ai_players, args.max_turns, recorder, seed)
+        total_turns += turns
+        if game.game_over:
+            wins[game.winner] += 1
+        else:
+            unfinished += 1
+    elapsed = time.perf_counter() - start
+    if pool is not None:
+        pool.close()
+    if stats_log is not None:
+        stats_log.close()
+    if recorder is not None:
+        recorder.close()
+
+    print(f"startup time: {STARTUP_TIME * 1000:.1f} ms")
+    print(f"games: {args.games} in {elapsed:.2f} s ({args.games / elapsed:.1f} games/sec)")
+    print(f"turns/game: {total_turns / args.games:.1f}")
+    for player_id, count in enumerate(wins):
+        print(f"Player {player_id+1} wins: {count} ({100 * count / args.games:.1f}%)")
+    if unfinished:
+        print(f"unfinished (hit --max-turns): {unfinished}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import random
+from array import array
+
+from ludo_endgame import RACE_POSITIONS, players_can_meet, race_index, race_positions
+from ludo_engine import (
+    HOME, MOVING, NUM_PLAYERS, NUM_TOKENS, POS, ROLLING, STATE_SIZE, TURN, WINNER, CompactState, LudoGame,
+)
+
+def test_race_index_is_a_bijection():
+    indices = sorted(race_index(values, home) for home, values in race_positions())
+    assert indices == list(range(RACE_POSITIONS))
+
+def race_state(positions, tiles):
+    # Player 0 to roll with the given token positions
+    data = array("b", [0] * STATE_SIZE)
+    data[POS:HOME] = array("b", positions)
+    for player_id in range(NUM_PLAYERS):
+        data[HOME + player_id] = positions[player_id * NUM_TOKENS:(player_id + 1) * NUM_TOKENS].count(40)
+    data[WINNER] = -1
+    return CompactState(data, tiles)
+
+def test_players_apart():
+    tiles = CompactState.from_game(LudoGame()).tiles
+    # Every player with one token home and two at the end of their path
+    positions = [40, 37, 38] * NUM_PLAYERS
+    assert not players_can_meet(race_state(positions, tiles))
+    # Player 0's token on path position 2 can land on player 1's token on
+    # ring square 6 (their path position 38) with a 4
+    positions[1] = 2
+    assert players_can_meet(race_state(positions, tiles))
+    # and a token in base can reach nearly every square
+    positions[1] = -1
+    assert players_can_meet(race_state(positions, tiles))
+
+def test_no_capture_once_players_are_apart():
+    rng = random.Random(7)
+    tiles = CompactState.from_game(LudoGame()).tiles
+    checked = 0
+    for _ in range(2000):
+        # One token home and two far along the path, so some positions are
+        # apart
+        positions = []
+        for _ in range(NUM_PLAYERS):
+            positions += [40, rng.randint(28, 38), rng.randint(28, 38)]
+        state = race_state(positions, tiles)
+        if players_can_meet(state):
+            continue
+        checked += 1
+        while state.data[WINNER] < 0:
+            before = state.data[POS:HOME]
+            if state.data[TURN] == ROLLING:
+                state.roll(rng.randint(1, 6))
+            elif state.data[TURN] == MOVING:
+                state.make_move(*rng.choice(state.get_available_moves()))
+            else:
+                state.use_powerup()
+            assert not any(0 <= old < 40 and new == -1 for old, new in zip(before, state.data[POS:HOME]))
+    assert checked > 50
@@ -0,0 +1,107 @@
+import random
+from array import array
+
+from ludo_engine import (
+    MOVING, NUM_PLAYERS, NUM_TILES, NUM_TOKENS, POS, RING_SQUARE, SAFE_TILE, TURN, CompactState,
+    DangerEvaluator, LudoGame,
+)
+
+def random_games(seed, games, evaluator=None):
+    # Every position of seeded random games, as (game, state) with state
+    # played along through CompactState's own move functions
+    rng = random.Random(seed)
+    for _ in range(games):
+        random.seed(rng.getrandbits(32))
+        game = LudoGame()
+        state = CompactState.from_game(game)
+        if evaluator is not None:
+            evaluator.prepare(state)
+        turns = 0
+        while not game.game_over and turns < 2000:
+            turns += 1
+            yield game, state
+            if game.turn_state == "rolling":
+                dice = rng.randint(1, 6)
+                game.roll_dice(dice)
+                state.roll(dice)
+            elif game.turn_state == "moving":
+                move = rng.choice(game.available_moves)
+                game.make_move(game.current_player, *move)
+                state.make_move(*move)
+            else:
+                game.use_powerup(game.current_player)
+                state.use_powerup()
+        yield game, state
+
+def fresh(state, evaluator=None):
+    rebuilt = CompactState(array("b", state.data), state.tiles)
+    if evaluator is not None:
+        evaluator.prepare(rebuilt)
+    return rebuilt
+
+def tokens_on_ring(state, player_id):
+    for position in state.data[POS + player_id * NUM_TOKENS:POS + (player_id + 1) * NUM_TOKENS]:
+        if 0 <= position < 40:
+            yield position
+
+def squares_in_danger(state):
+    # Per player, the unsafe squares they stand on that an opponent can land
+    # on with one roll, counted token by token and roll by roll
+    counts = []
+    for player_id in range(NUM_PLAYERS):
+        squares = set()
+        for position in tokens_on_ring(state, player_id):
+            square = RING_SQUARE[player_id][position]
+            if state.tiles[player_id * NUM_TILES + position] == SAFE_TILE:
+                continue
+            for opponent_id in range(NUM_PLAYERS):
+                if opponent_id == player_id:
+                    continue
+                for source in tokens_on_ring(state, opponent_id):
+                    for roll in range(1, 7):
+                        target = source + roll
+                        if (target < 39 and RING_SQUARE[opponent_id][target] == square
+                                and state.tiles[opponent_id * NUM_TILES + target] != SAFE_TILE):
+                            squares.add(square)
+        counts.append(len(squares))
+    return counts
+
+def test_compact_state_follows_game():
+    mismatches = 0
+    for game, state in random_games(1, 50):
+        expected = CompactState.from_game(game)
+        if state.data != expected.data or state.occupancy != game.occupancy:
+            mismatches += 1
+    assert mismatches == 0
+
+def test_incremental_fields_match_recomputation():
+    evaluator = DangerEvaluator()
+    for _, state in random_games(2, 30, evaluator):
+        rebuilt = fresh(state, evaluator)
+        assert state.hash == state.compute_hash() == rebuilt.hash
+        assert state.occupancy == rebuilt.occupancy
+        assert state.totals == rebuilt.totals
+        assert state.landing == rebuilt.landing
+        assert state.danger == rebuilt.danger == squares_in_danger(state)
+
+def test_unmake_restores_position():
+    checked = 0
+    for _, state in random_games(3, 30, DangerEvaluator()):
+        if state.data[TURN] != MOVING:
+            continue
+        for move in state.get_available_moves():
+            before = (array("b", state.data), state.hash, state.occupancy[:], state.totals[:], state.danger)
+            undo = state.make_move(*move)
+            assert undo is not None
+            state.unmake_move(undo)
+            assert (state.data, state.hash, state.occupancy, state.totals, state.danger) == before
+            checked += 1
+    assert checked > 1000
+
+def test_roll_and_powerup_undo():
+    for _, state in random_games(4, 10):
+        before = (array("b", state.data), state.hash)
+        undo = state.roll(6) or state.use_powerup()
+        if undo is not None:
+            state.unmake_move(undo)
+            assert (state.data, state.hash) == before
@@ -0,0 +1,66 @@
+import random
+
+from ludo_engine import LudoGame
+from ludo_record import GameArchive, GameRecordWriter, player_config
+
+def positions(game):
+    return [[token.position for token in player.tokens] for player in game.players]
+
+def play(game, rng, games):
+    # Plays seeded random games on game; returns each one's final token
+    # positions
+    finals = []
+    for _ in range(games):
+        game.reset_game()
+        while not game.game_over:
+            if game.turn_state == "rolling":
+                game.roll_dice(rng.randint(1, 6))
+            elif game.turn_state == "moving":
+                game.make_move(game.current_player, *rng.choice(game.available_moves))
+            else:
+                game.use_powerup(game.current_player)
+        finals.append(positions(game))
+    return finals
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "games.rec")
+    game = LudoGame()
+    with GameRecordWriter(path) as writer:
+        writer.attach(game, [player_config(None)] * 5)
+        finals = play(game, random.Random(1), 5)
+    with GameArchive(path) as archive:
+        assert len(archive) == 5
+        for record, final in zip(archive, finals):
+            assert record.players == [{"type": "human"}] * 5
+            assert positions(record.game_at(len(record))) == final
+
+def test_appends_to_an_archive(tmp_path):
+    path = str(tmp_path / "games.rec")
+    game = LudoGame()
+    finals = []
+    for seed in (1, 2):
+        with GameRecordWriter(path) as writer:
+            writer.attach(game)
+            finals += play(game, random.Random(seed), 2)
+    with GameArchive(path) as archive:
+        assert [positions(record.game_at(len(record))) for record in archive] == finals
+
+def test_repairs_a_game_cut_off_by_a_crash(tmp_path):
+    path = str(tmp_path / "games.rec")
+    game = LudoGame()
+    writer = GameRecordWriter(path)
+    writer.attach(game)
+    finals = play(game, random.Random(3), 3)
+    writer.file.flush()
+    # Cut the last game off in the middle of a turn record
+    writer.file.truncate(writer.file.tell() - 7)
+    writer.file.close()
+    writer.index.close()
+    GameRecordWriter(path).close()
+    with GameArchive(path) as archive:
+        assert len(archive) == 3
+        for record, final in zip(list(archive)[:2], finals):
+            assert positions(record.game_at(len(record))) == final
+        last = archive.game(2)
+        assert len(last) > 0
+        last.game_at(len(last))
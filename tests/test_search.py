@@ -0,0 +1,61 @@
+import math
+
+import pytest
+
+from bench import mid_game_positions
+from ludo_engine import AIPlayer, CompactState, DangerEvaluator
+from ludo_parallel import SearchPool
+
+POSITIONS = mid_game_positions(12, seed=5)
+
+def search(position, **settings):
+    ai = AIPlayer(position.current_player, **settings)
+    return ai.choose_move(CompactState.from_game(position), position.available_moves), ai.stats["value"]
+
+@pytest.mark.parametrize("mode", ["star1", "star2"])
+@pytest.mark.parametrize("evaluator", [None, DangerEvaluator])
+def test_star_pruning_matches_expectimax(mode, evaluator):
+    def make():
+        return evaluator() if evaluator else None
+    for position in POSITIONS:
+        move, value = search(position, depth=2, search=mode, evaluator=make())
+        expected_move, expected_value = search(position, depth=2, search="expectimax", evaluator=make())
+        assert move == expected_move
+        assert value == pytest.approx(expected_value)
+
+@pytest.mark.parametrize("mode", ["minimax", "star1"])
+def test_transposition_table_keeps_the_move(mode):
+    for position in POSITIONS:
+        assert search(position, depth=3, search=mode, tt_size=1 << 12)[0] == search(position, depth=3, search=mode)[0]
+
+@pytest.mark.parametrize("mode", ["minimax", "star1"])
+def test_root_window_picks_the_first_best_move(mode):
+    # The root searches each move against the best value so far; scoring
+    # every move with a full window must give the same move and value
+    for position in POSITIONS:
+        state = CompactState.from_game(position)
+        ai = AIPlayer(position.current_player, search=mode)
+        ai.begin_search(state)
+        values = []
+        for move in position.available_moves:
+            undo = state.make_move(*move)
+            if mode == "minimax":
+                values.append(ai.minimax(state, 2, -math.inf, math.inf, False))
+            else:
+                values.append(ai.expectimax(state, 2, -math.inf, math.inf))
+            state.unmake_move(undo)
+        move, value = search(position, depth=3, search=mode)
+        assert move == position.available_moves[values.index(max(values))]
+        assert value == pytest.approx(max(values))
+
+def test_pool_matches_serial_search():
+    with SearchPool(2) as pool:
+        for mode in ("minimax", "star1"):
+            for position in POSITIONS:
+                assert search(position, depth=2, search=mode, pool=pool)[0] == search(position, depth=2, search=mode)[0]
+
+def test_time_budget_returns_a_legal_move():
+    for position in POSITIONS[:4]:
+        ai = AIPlayer(position.current_player, search="star1", time_budget_ms=20)
+        assert ai.get_move(position) in position.available_moves
+        assert ai.stats["elapsed_ms"] < 20 + 50
@@ -0,0 +1,123 @@
+import asyncio
+import json
+
+import pytest
+
+from ludo_engine import RING_SQUARE
+from ludo_server import SEND_QUEUE, Connection, GameServer, encode
+
+HUMANS = ["human"] * 5
+
+@pytest.fixture
+def server():
+    server = GameServer(workers=1)
+    yield server
+    server.close()
+
+class Client:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, message):
+        self.writer.write(encode(message))
+        await self.writer.drain()
+
+    async def receive(self):
+        return json.loads(await asyncio.wait_for(self.reader.readline(), 5))
+
+async def connect(server, path):
+    listener = await asyncio.start_unix_server(server.handle_client, path)
+    return listener, Client(*await asyncio.open_unix_connection(path))
+
+async def disconnect(server, client):
+    # Waits until the server has cleaned up after the client
+    tasks = list(server.clients.values())
+    client.writer.close()
+    await asyncio.wait_for(asyncio.gather(*tasks), 5)
+    assert not server.tables
+
+async def create_table(client, seats):
+    await client.send({"op": "create", "seats": seats})
+    created = await client.receive()
+    snapshot = await client.receive()
+    assert created["type"] == "created" and snapshot["type"] == "snapshot"
+    return created["table"]
+
+def test_illegal_move_is_rejected(server, tmp_path):
+    async def run():
+        listener, client = await connect(server, str(tmp_path / "server.sock"))
+        async with listener:
+            table_id = await create_table(client, HUMANS)
+            # Token 0 on square 0 with a roll of 2: it can move, not go home
+            game = server.tables[table_id].game
+            game.players[0].tokens[0].position = 0
+            game.occupancy[0] |= 1 << RING_SQUARE[0][0]
+            game.turn_state = "moving"
+            game.dice_roll = 2
+            game.available_moves = game.get_available_moves(0)
+            await client.send({"op": "move", "table": table_id, "token": 0, "move_type": "home", "id": 1})
+            reply = await client.receive()
+            assert reply == {"type": "error", "error": "illegal move", "id": 1}
+            assert game.players[0].tokens[0].position == 0 and game.players[0].tokens_home == 0
+            await client.send({"op": "move", "table": table_id, "token": 0, "move_type": "move"})
+            delta = await client.receive()
+            assert delta["type"] == "delta" and [0, 2] in delta["changes"]["tokens"]
+            await disconnect(server, client)
+    asyncio.run(run())
+
+def test_join_rejects_seats_out_of_range(server, tmp_path):
+    async def run():
+        listener, client = await connect(server, str(tmp_path / "server.sock"))
+        async with listener:
+            table_id = await create_table(client, HUMANS)
+            for seat in (-1, 5):
+                await client.send({"op": "join", "table": table_id, "seat": seat})
+                assert (await client.receive())["error"] == f"no seat {seat}"
+            await disconnect(server, client)
+    asyncio.run(run())
+
+class StalledWriter:
+    # A client that never reads: drain blocks, or fails when broken is set
+    def __init__(self, reader=None, broken=False):
+        self.reader = reader
+        self.broken = broken
+        self.written = []
+        self.closed = False
+
+    def write(self, data):
+        self.written.append(data)
+
+    async def drain(self):
+        if self.broken:
+            raise ConnectionResetError
+        await asyncio.Event().wait()
+
+    def close(self):
+        # Like a transport, closing ends the stream read from it
+        self.closed = True
+        if self.reader is not None:
+            self.reader.feed_eof()
+
+def test_coalescing_keeps_replies():
+    async def run():
+        connection = Connection(StalledWriter())
+        await asyncio.sleep(0)
+        connection.send({"type": "created", "table": 0})
+        for version in range(SEND_QUEUE):
+            connection.push_delta(encode({"type": "delta", "version": version}))
+        lines = [line for line, _ in connection.queue]
+        assert lines == [encode({"type": "created", "table": 0})]
+        connection.task.cancel()
+    asyncio.run(run())
+
+def test_client_is_cleaned_up_when_writing_fails(server):
+    async def run():
+        reader = asyncio.StreamReader()
+        writer = StalledWriter(reader, broken=True)
+        reader.feed_data(encode({"op": "create", "seats": HUMANS}))
+        task = asyncio.create_task(server.handle_client(reader, writer))
+        await asyncio.wait_for(task, 5)
+        assert writer.closed
+        assert not server.tables and not server.clients
+    asyncio.run(run())
@@ -0,0 +1,18 @@
+import pytest
+
+from tournament import ELO_MEAN, elo_ratings, parse_config
+
+def test_elo_with_a_single_config():
+    results = [{"seats": [0] * 5, "winner": 2}, {"seats": [0] * 5, "winner": -1}]
+    assert elo_ratings(["minimax:1"], results) == [ELO_MEAN]
+
+def test_elo_orders_configs_by_wins():
+    results = [{"seats": [0, 1, 0, 1, 0], "winner": seat} for seat in (0, 2, 4, 1, 0)]
+    stronger, weaker = elo_ratings(["a", "b"], results)
+    assert stronger > ELO_MEAN > weaker
+    assert stronger + weaker == pytest.approx(2 * ELO_MEAN)
+
+@pytest.mark.parametrize("spec", ["minimax:0", "star1:-1", "mcts:0"])
+def test_parse_config_rejects_non_positive_settings(spec):
+    with pytest.raises(ValueError):
+        parse_config(spec)
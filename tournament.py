@@ -0,0 +1,228 @@
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from ludo_engine import EVALUATORS, NUM_PLAYERS, SEARCH_MODES, AIPlayer
+from selfplay import play_game
+
+# Multiplayer Elo: every game counts as a win for the winner's config over
+# each other config at the table. Ratings are the Bradley-Terry maximum
+# likelihood fit of those pairwise results on the Elo scale, with the
+# configs averaging ELO_MEAN.
+ELO_MEAN = 1500
+ELO_ITERATIONS = 1000
+# Games per task sent to a worker
+DEFAULT_CHUNK = 4
+
+def parse_config(spec):
+    # NAME=SEARCH[:DEPTH[:EVALUATOR]]; for SEARCH mcts, DEPTH is the rollouts
+    # per move. e.g. d2=minimax:2, safe3=star1:3:safe, mcts=mcts:200
+    name, _, setting = spec.partition("=")
+    if not setting:
+        name, setting = spec, spec
+    parts = setting.split(":")
+    search = parts[0]
+    if search not in SEARCH_MODES and search != "mcts":
+        raise ValueError(f"unknown search mode {search!r} in {spec!r}")
+    config = {"name": name, "search": search}
+    if search == "mcts":
+        config["iterations"] = int(parts[1]) if len(parts) > 1 else 1000
+        if config["iterations"] <= 0:
+            raise ValueError(f"iterations must be positive in {spec!r}")
+    else:
+        config["depth"] = int(parts[1]) if len(parts) > 1 else 2
+        if config["depth"] <= 0:
+            raise ValueError(f"depth must be positive in {spec!r}")
+        config["evaluator"] = parts[2] if len(parts) > 2 else "score"
+        if config["evaluator"] not in EVALUATORS:
+            raise ValueError(f"unknown evaluator {config['evaluator']!r} in {spec!r}")
+    return config
+
+def make_player(config, player_id, seed):
+    if config["search"] == "mcts":
+        from ludo_mcts import MCTSPlayer
+        return MCTSPlayer(player_id, config["iterations"], seed=seed)
+    return AIPlayer(player_id, depth=config["depth"], search=config["search"],
+                    evaluator=EVALUATORS[config["evaluator"]]())
+
+def seating(game_index, config_count):
+    # Config index of each seat. Successive games shift every config one
+    # seat along, so over config_count games each one sits everywhere.
+    return [(game_index + seat) % config_count for seat in range(NUM_PLAYERS)]
+
+def game_seed(seed, game_index):
+    return random.Random(seed * 1000003 + game_index).getrandbits(63)
+
+def play_games(configs, seed, game_indices, max_turns):
+    # Worker task: plays the games and returns one result record per game
+    results = []
+    for game_index in game_indices:
+        seats = seating(game_index, len(configs))
+        game_random = random.Random(game_seed(seed, game_index))
+        players = [make_player(configs[config], player_id, game_random.getrandbits(63))
+                   for player_id, config in enumerate(seats)]
+        random.seed(game_random.getrandbits(63))
+        start = time.perf_counter()
+        game, turns = play_game(players, max_turns)
+        results.append({"game": game_index, "seats": seats, "winner": game.winner if game.game_over else -1,
+                        "turns": turns, "seconds": round(time.perf_counter() - start, 4)})
+    return results
+
+def load_results(path, header):
+    # Results already in the file, keyed by game index. A line cut off by a
+    # crash is dropped from the file.
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, "rb+") as f:
+        lines = f.read().split(b"\n")
+        if lines and lines[-1]:
+            f.truncate(sum(len(line) + 1 for line in lines[:-1]))
+    lines = [line for line in lines[:-1] if line]
+    if lines:
+        saved = json.loads(lines[0])
+        if saved != header:
+            raise ValueError(f"{path} holds a run with different settings")
+        for line in lines[1:]:
+            record = json.loads(line)
+            results[record["game"]] = record
+    return results
+
+def run_tournament(configs, games, path, seed=0, workers=None, chunk=DEFAULT_CHUNK, max_turns=10000,
+                   progress=None):
+    # Plays games 0..games-1, appending each result to path as soon as it
+    # arrives; progress, if given, is called with each new result. Rerunning
+    # with the same settings resumes where it stopped. Returns all results,
+    # in game order.
+    header = {"type": "tournament", "configs": configs, "seed": seed, "max_turns": max_turns}
+    results = load_results(path, header)
+    todo = [game_index for game_index in range(games) if game_index not in results]
+    with open(path, "a") as out:
+        if out.tell() == 0:
+            out.write(json.dumps(header) + "\n")
+            out.flush()
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(workers) as executor:
+            pending = set()
+            tasks = iter(range(0, len(todo), chunk))
+            # Keep a bounded number of tasks queued so results stream back
+            # steadily and an interrupted run loses at most those
+            limit = 2 * workers
+            while True:
+                for start in tasks:
+                    pending.add(executor.submit(play_games, configs, seed, todo[start:start + chunk], max_turns))
+                    if len(pending) >= limit:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for record in future.result():
+                        out.write(json.dumps(record) + "\n")
+                        results[record["game"]] = record
+                        if progress is not None:
+                            progress(record)
+                    out.flush()
+                    os.fsync(out.fileno())
+    return [results[game_index] for game_index in sorted(results) if game_index < games]
+
+def win_rates(configs, results):
+    # Per config: (wins, seats played, win rate, 95% confidence half-width),
+    # where a config that sits twice at a table plays two seats
+    rows = []
+    for config_index in range(len(configs)):
+        seats = wins = 0
+        for record in results:
+            seats += record["seats"].count(config_index)
+            if record["winner"] >= 0 and record["seats"][record["winner"]] == config_index:
+                wins += 1
+        rate = wins / seats if seats else 0.0
+        margin = 1.96 * math.sqrt(rate * (1 - rate) / seats) if seats else 0.0
+        rows.append((wins, seats, rate, margin))
+    return rows
+
+def elo_ratings(configs, results):
+    # Bradley-Terry fit by the minorization-maximization updates
+    # s_i = W_i / sum_j (n_ij / (s_i + s_j)), where W_i counts pairwise wins
+    # and n_ij the pairwise games between configs i and j
+    count = len(configs)
+    if count < 2:
+        # Nobody to be rated against
+        return [ELO_MEAN] * count
+    wins = [0] * count
+    pairs = [[0] * count for _ in range(count)]
+    for record in results:
+        if record["winner"] < 0:
+            continue
+        winner = record["seats"][record["winner"]]
+        for seat, config_index in enumerate(record["seats"]):
+            if config_index != winner:
+                wins[winner] += 1
+                pairs[winner][config_index] += 1
+                pairs[config_index][winner] += 1
+    # Half a win and half a loss against every other config keeps a config
+    # that never won (or never lost) at a finite rating
+    for i in range(count):
+        wins[i] += 0.5 * (count - 1)
+        for j in range(count):
+            if i != j:
+                pairs[i][j] += 1
+    strength = [1.0] * count
+    for _ in range(ELO_ITERATIONS):
+        updated = [wins[i] / sum(pairs[i][j] / (strength[i] + strength[j]) for j in range(count) if j != i)
+                   for i in range(count)]
+        scale = math.exp(sum(math.log(value) for value in updated) / count)
+        updated = [value / scale for value in updated]
+        change = max(abs(a - b) for a, b in zip(updated, strength))
+        strength = updated
+        if change < 1e-12:
+            break
+    return [ELO_MEAN + 400 * math.log10(value) for value in strength]
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless AI tournament with win rates and Elo ratings")
+    parser.add_argument("configs", nargs="+",
+                        help="NAME=SEARCH[:DEPTH[:EVALUATOR]], e.g. d2=minimax:2 s3=star1:3:safe m=mcts:200")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--output", default="tournament.jsonl", help="results file; rerun to resume")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="games per worker task")
+    parser.add_argument("--max-turns", type=int, default=10000)
+    args = parser.parse_args()
+
+    try:
+        configs = [parse_config(spec) for spec in args.configs]
+    except ValueError as error:
+        parser.error(str(error))
+    start = time.perf_counter()
+    played = []
+    def progress(record):
+        played.append(record)
+        if len(played) % 100 == 0:
+            print(f"{len(played)} games played", flush=True)
+    try:
+        results = run_tournament(configs, args.games, args.output, args.seed, args.workers, args.chunk,
+                                 args.max_turns, progress)
+    except ValueError as error:
+        parser.error(str(error))
+    elapsed = time.perf_counter() - start
+    print(f"{len(played)} games played in {elapsed:.1f} s ({len(played) / elapsed:.1f} games/sec), "
+          f"{len(results)} in {args.output}")
+    unfinished = sum(1 for record in results if record["winner"] < 0)
+    if unfinished:
+        print(f"unfinished (hit --max-turns): {unfinished}")
+    ratings = elo_ratings(configs, results)
+    print(f"{'config':<16}{'setting':<22}{'seats':>7}{'wins':>7}{'win rate (95% CI)':>22}{'Elo':>8}")
+    for config, (wins, seats, rate, margin), rating in sorted(zip(configs, win_rates(configs, results), ratings),
+                                                              key=lambda row: -row[2]):
+        setting = ":".join(str(value) for key, value in config.items() if key != "name")
+        print(f"{config['name']:<16}{setting:<22}{seats:>7}{wins:>7}{100 * rate:>14.1f}% +-{100 * margin:4.1f}"
+              f"{rating:>8.0f}")
+
+if __name__ == "__main__":
+    main()